@@ -0,0 +1,143 @@
+"""
+Acceso asíncrono a la API de Canvas con httpx (opcional).
+
+AsyncCanvasClient mantiene un httpx.AsyncClient (con HTTP/2 si está instalado 'h2' y se pide)
+en un bucle de eventos propio que corre en un hilo de fondo. Cualquier hilo puede ejecutar en él
+una corrutina con 'run' (cancelable con un threading.Event), de modo que los hilos que revisan
+cursos comparten un único pool de conexiones y, dentro de cada curso, las consultas independientes
+se hacen a la vez con asyncio.gather en lugar de una tras otra.
+
+Los contadores, el frenado por X-Rate-Limit-Remaining y la política de reintentos son los del
+CanvasClient síncrono que recibe, por lo que ambas vías comparten la cuota y las estadísticas;
+las corrutinas corren con las variables de contexto del hilo que las lanza, de modo que sus
+peticiones se registran en el Metrics de su ejecución (instrumentation.use_metrics).
+Si httpx no está instalado, 'is_available()' retorna False y se usa solo la vía síncrona.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+try:
+    import httpx
+except ImportError:  # dependencia opcional
+    httpx = None
+
+from canvas_client import RequestAttempts
+
+
+def is_available():
+    return httpx is not None
+
+
+def http2_supported():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def _in_context(context, coro):
+    # Una tarea corre en su propia copia del contexto del bucle; se le pasan las variables del hilo que la lanzó
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+class AsyncCanvasClient:
+    """Cliente asíncrono compartido entre hilos. Se debe crear una sola instancia por proceso."""
+
+    def __init__(self, sync_client, pool_size=32, http2=False, timeout=60.0):
+        if httpx is None:
+            raise RuntimeError("httpx no está instalado")
+        self.sync_client = sync_client
+        self.http2 = http2 and http2_supported()
+        # httpx registra cada petición en INFO; las peticiones ya se miden en instrumentation.Metrics
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="canvas-async", daemon=True)
+        self._thread.start()
+        self._client = self.run(self._create_client(pool_size, timeout))
+
+    async def _create_client(self, pool_size, timeout):
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        return httpx.AsyncClient(headers=dict(self.sync_client.session.headers), http2=self.http2,
+                                 limits=limits, timeout=timeout)
+
+    def run(self, coro, timeout=None, cancel_event=None):
+        """
+        Ejecuta la corrutina en el bucle del cliente y espera su resultado desde el hilo que llama.
+        Si se agota 'timeout' o se activa 'cancel_event', la corrutina (y sus peticiones en curso)
+        se cancela y se lanza concurrent.futures.CancelledError o TimeoutError.
+        """
+        future = asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), self._loop)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            while True:
+                # Con un evento de cancelación se espera en intervalos cortos para revisarlo
+                wait = None if cancel_event is None else 0.1
+                if deadline is not None:
+                    remaining = max(0.0, deadline - time.monotonic())
+                    wait = remaining if wait is None else min(wait, remaining)
+                try:
+                    return future.result(wait)
+                except FutureTimeoutError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise
+                    if cancel_event.is_set():
+                        raise CancelledError()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def close(self):
+        """Cierra las conexiones y detiene el bucle de eventos. Se puede llamar más de una vez."""
+        if self._loop.is_closed():
+            return
+        try:
+            self.run(self._client.aclose(), timeout=10)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    async def request(self, method, url, **kwargs):
+        """Equivalente asíncrono de CanvasClient.request: reintenta y frena con la misma RequestAttempts."""
+        attempts = RequestAttempts(self.sync_client, method, url)
+        while True:
+            await asyncio.sleep(attempts.throttle())
+            try:
+                response = await self._client.request(attempts.method.upper(), url, **kwargs)
+            except (httpx.TransportError, httpx.TimeoutException):
+                delay = attempts.failed()
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            delay = attempts.received(response)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+
+    async def get(self, url, params=None):
+        """Retorna el JSON de un recurso, o None si la respuesta no es OK."""
+        response = await self.request("get", url, params=params)
+        if not response.is_success:
+            return None
+        return response.json() if response.text else None
+
+    async def get_all(self, url, params=None):
+        """Recorre las páginas de un listado siguiendo el header Link. Retorna la lista o None si alguna falla."""
+        items = []
+        while url:
+            response = await self.request("get", url, params=params)
+            params = None  # la URL de la página siguiente ya incluye los parámetros
+            if not response.is_success:
+                return None
+            items.extend(response.json() if response.text else [])
+            url = response.links.get("next", {}).get("url")
+        return items
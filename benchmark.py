@@ -0,0 +1,132 @@
+"""
+Mediciones reproducibles del revisor contra el Canvas falso (fake_canvas), sin red.
+
+Para cada cantidad de cursos se levanta un Canvas falso nuevo y se mide, en cursos por segundo,
+'Revisar' (review_courses) y 'Corregir' (plan_corrections + apply_corrections), junto con las
+peticiones HTTP que hizo cada uno. También se mide distribuir_estudiantes hasta 100k estudiantes.
+
+Uso:
+    python -m benchmark
+    python -m benchmark --courses 10 100 --latency 0.05 --workers 16 --output bench_output.txt
+    python -m benchmark --json > resultados.json
+
+Las variables de .env que ajustan el revisor (MAX_WORKERS, PROVISION_RATE, HTTP_POOL_SIZE, ...)
+se respetan; BASE_URL y TOKEN se fijan para apuntar al servidor local.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+from fake_canvas import FakeCanvas, start_server
+from instrumentation import Metrics, use_metrics
+
+PARTITION_SIZES = (1_000, 10_000, 100_000)
+
+
+def _run(revisor, label, func):
+    revisor.request_cache.invalidate()
+    with use_metrics(Metrics()) as metrics:
+        start = time.perf_counter()
+        courses = func()
+        elapsed = time.perf_counter() - start
+    http = metrics.counters()
+    return {"benchmark": label, "courses": courses, "seconds": round(elapsed, 3),
+            "courses_per_second": round(courses / elapsed, 2) if elapsed else None,
+            "requests": http["requests"], "retries": http["retries"]}
+
+
+def bench_courses(revisor, server, n_courses, workers, students, quota=None):
+    """Mide Revisar y Corregir sobre 'n_courses' cursos de un Canvas falso recién creado."""
+    server.RequestHandlerClass.canvas = FakeCanvas(students_per_course=students, quota=quota)
+    course_ids = [str(course_id) for course_id in range(1, n_courses + 1)]
+    # Almacén propio de la medición, para no mezclar los cursos falsos con los de revisiones reales
+    snapshot_db = os.path.join(tempfile.mkdtemp(prefix="benchmark-"), "revisiones.sqlite3")
+
+    def review():
+        return sum(1 for _ in revisor.review_courses(course_ids, workers))
+
+    def correct():
+        plans = list(revisor.plan_corrections(course_ids, workers, snapshot_db))
+        for _ in revisor.apply_corrections(plans, workers, snapshot_db):
+            pass
+        return len(plans)
+
+    return [_run(revisor, "revisar", review), _run(revisor, "corregir", correct),
+            _run(revisor, "revisar (después de corregir)", review)]
+
+
+def bench_partition(revisor, sizes=PARTITION_SIZES, repeat=5):
+    """Mejor tiempo de distribuir_estudiantes, sin y con clave de equilibrio, para cada cantidad de estudiantes."""
+    rows = []
+    for n in sizes:
+        student_ids = list(range(n))
+        for label, key in (("distribuir_estudiantes", None), ("distribuir_estudiantes (key)", lambda sid: sid % 40)):
+            seconds = min(timeit.repeat(lambda: revisor.distribuir_estudiantes(student_ids, 3, 4, key),
+                                        number=1, repeat=repeat))
+            rows.append({"benchmark": label, "students": n, "seconds": round(seconds, 5)})
+    return rows
+
+
+def format_rows(rows):
+    lines = []
+    for row in rows:
+        if "students" in row:
+            lines.append(f"{row['benchmark']:<32} {row['students']:>7} estudiantes  {row['seconds'] * 1000:9.2f} ms")
+        else:
+            lines.append(f"{row['benchmark']:<32} {row['courses']:>7} cursos  {row['seconds']:9.2f} s  "
+                         f"{row['courses_per_second']:8.2f} cursos/s  {row['requests']:>7} peticiones  "
+                         f"{row['retries']:>4} reintentos")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Mide el revisor contra un Canvas falso local.")
+    parser.add_argument("--courses", type=int, nargs="+", default=[10, 100, 1000], help="Cantidades de cursos a medir")
+    parser.add_argument("--workers", type=int, help="Cursos en paralelo (por defecto, MAX_WORKERS)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Segundos de espera por petición del Canvas falso")
+    parser.add_argument("--students", type=int, default=30, help="Estudiantes por curso")
+    parser.add_argument("--quota", type=float, help="Cuota del límite de tasa del Canvas falso (sin límite si se omite)")
+    parser.add_argument("--skip-partition", action="store_true", help="No medir distribuir_estudiantes")
+    parser.add_argument("--json", action="store_true", help="Escribe los resultados como JSON")
+    parser.add_argument("--output", "-o", help="Archivo de salida (por defecto, la salida estándar)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = start_server(latency=args.latency, default_per_page=10)
+    os.environ["BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/api/v1"
+    os.environ.setdefault("TOKEN", "benchmark")
+    import revisor  # después de fijar BASE_URL, que se lee al importar
+
+    workers = args.workers or revisor.MAX_WORKERS
+    rows = []
+    try:
+        for n_courses in args.courses:
+            rows.extend(bench_courses(revisor, server, n_courses, workers, args.students, args.quota))
+            print(format_rows(rows[-3:]), file=sys.stderr)
+        if not args.skip_partition:
+            rows.extend(bench_partition(revisor))
+    finally:
+        server.shutdown()
+
+    settings = {"workers": workers, "latency": args.latency, "students": args.students, "quota": args.quota,
+                "provision_rate": revisor.PROVISION_RATE, "python": sys.version.split()[0]}
+    if args.json:
+        text = json.dumps({"settings": settings, "results": rows}, ensure_ascii=False, indent=2)
+    else:
+        text = " ".join(f"{key}={value}" for key, value in settings.items()) + "\n" + format_rows(rows)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
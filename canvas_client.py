@@ -0,0 +1,178 @@
+"""
+Cliente HTTP para la API de Canvas.
+
+Envuelve una requests.Session compartida entre hilos y agrega:
+- un pool de conexiones del tamaño de la concurrencia que se usa,
+- frenado adaptativo según los headers X-Rate-Limit-Remaining de Canvas,
+- reintentos con espera exponencial y aleatoria para 429, 403 por límite de tasa y 5xx,
+- opcionalmente, el registro de cada petición (latencia y bytes), de su costo (X-Request-Cost),
+  de los reintentos y del tiempo esperado en el Metrics de la ejecución en curso
+  (instrumentation.current_metrics), o en el que recibe si no hay una.
+
+No depende de Streamlit, por lo que puede usarse desde cualquier interfaz.
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import current_metrics
+
+# Métodos que se pueden repetir sin riesgo de duplicar cambios si Canvas ya procesó la petición
+IDEMPOTENT_METHODS = {"get", "put", "delete"}
+RETRY_STATUS = {500, 502, 503, 504}
+
+
+class CanvasClient:
+    """
+    Cliente seguro para hilos. Canvas asigna a cada token una cuota que se consume con el costo
+    de cada petición y se recupera con el tiempo; cuando la cuota restante baja de 'low_water'
+    las peticiones siguientes se espacian en proporción a lo que falta, antes de recibir un 403.
+    """
+
+    def __init__(self, headers, pool_size=32, max_retries=5, backoff_base=0.5, backoff_max=30.0,
+                 low_water=200.0, max_throttle_delay=2.0, metrics=None):
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.low_water = low_water
+        self.max_throttle_delay = max_throttle_delay
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._remaining = None
+
+    def current_metrics(self):
+        """Metrics donde se registra la petición actual, o None si no se registran."""
+        return current_metrics(self.metrics)
+
+    def _count(self, name, amount=1):
+        metrics = self.current_metrics()
+        if metrics:
+            metrics.count(name, amount)
+
+    def request(self, method, url, **kwargs):
+        """
+        Realiza la petición reintentando cuando Canvas limita la tasa o falla de forma transitoria.
+        Retorna la última respuesta obtenida (que puede no ser OK); las excepciones de conexión
+        se propagan una vez agotados los reintentos.
+        """
+        attempts = RequestAttempts(self, method, url)
+        while True:
+            time.sleep(attempts.throttle())
+            try:
+                response = self.session.request(attempts.method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                delay = attempts.failed()
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            delay = attempts.received(response)
+            if delay is None:
+                return response
+            time.sleep(delay)
+
+    def record(self, response):
+        """Actualiza los contadores y la cuota restante con los headers de una respuesta."""
+        remaining = response.headers.get("X-Rate-Limit-Remaining")
+        cost = response.headers.get("X-Request-Cost")
+        self._count("requests")
+        if cost is not None:
+            try:
+                self._count("cost", float(cost))
+            except ValueError:
+                pass
+        if remaining is not None:
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                return
+            with self._lock:
+                self._remaining = remaining
+
+    def should_retry(self, method, response):
+        if response.status_code == 429 or self._is_rate_limited(response):
+            return True
+        return response.status_code in RETRY_STATUS and method in IDEMPOTENT_METHODS
+
+    @staticmethod
+    def _is_rate_limited(response):
+        # Canvas responde 403 con "Rate Limit Exceeded" cuando se agota la cuota del token
+        return response.status_code == 403 and "rate limit exceeded" in response.text.lower()
+
+    def throttle_delay(self):
+        """Segundos que debe esperar la próxima petición según la cuota restante (0 si no hace falta)."""
+        with self._lock:
+            remaining = self._remaining
+        if remaining is None or remaining >= self.low_water:
+            return 0.0
+        delay = self.max_throttle_delay * (self.low_water - max(remaining, 0.0)) / self.low_water
+        self._count("throttled")
+        self._count("wait_seconds", delay)
+        return delay
+
+    def backoff_delay(self, attempt, response, url):
+        """Segundos antes del reintento número 'attempt' (Retry-After si Canvas lo indica)."""
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+        status = response.status_code if response is not None else "sin respuesta"
+        logging.warning(f"Reintentando {url} ({status}) en {delay:.2f}s")
+        self._count("retries")
+        self._count("wait_seconds", delay)
+        return delay
+
+
+
+class RequestAttempts:
+    """
+    Política de reintentos de una petición, separada del envío y de la espera para que la usen
+    tanto CanvasClient como async_canvas.AsyncCanvasClient. Cada método retorna los segundos que
+    se deben esperar antes del siguiente intento, o None cuando ya no se debe reintentar.
+    """
+
+    def __init__(self, client, method, url):
+        self.client = client
+        self.method = method.lower()
+        self.url = url
+        self.attempt = 0
+        self.start = time.perf_counter()
+
+    def throttle(self):
+        """Espera antes de enviar un intento, según la cuota restante (0 si no hace falta)."""
+        return self.client.throttle_delay()
+
+    def failed(self):
+        """Tras un error de conexión o de tiempo de espera; con None la excepción se debe propagar."""
+        if self.method not in IDEMPOTENT_METHODS or self.attempt >= self.client.max_retries:
+            self._finish(0)
+            return None
+        return self._retry(None)
+
+    def received(self, response):
+        """Tras recibir una respuesta; con None esa respuesta es el resultado de la petición."""
+        self.client.record(response)
+        if self.attempt < self.client.max_retries and self.client.should_retry(self.method, response):
+            return self._retry(response)
+        self._finish(len(response.content), response.status_code)
+        return None
+
+    def _retry(self, response):
+        delay = self.client.backoff_delay(self.attempt, response, self.url)
+        self.attempt += 1
+        return delay
+
+    def _finish(self, size, status=None):
+        metrics = self.client.current_metrics()
+        if metrics:
+            metrics.record_request(self.method, self.url, time.perf_counter() - self.start, size, status)
@@ -0,0 +1,242 @@
+"""
+Revisión y corrección de tareas sin Streamlit, para ejecutarse desde cron o en lotes grandes.
+
+Uso:
+    python -m cli cursos.txt --output resultados.jsonl
+    cat cursos.txt | python -m cli - --accion corregir --dry-run --format csv
+    cat cursos.txt | python -m cli - --accion corregir --workers 8
+    python -m cli cursos.txt --processes 4 --workers 8 --output resultados.csv
+    python -m cli cursos.txt --incremental --output auditoria.jsonl
+    python -m cli cursos.txt --metrics metricas.json
+    python -m cli --account 1 --term 42 --subaccount 7 --pattern "^TALLER" --output periodo.jsonl
+
+Los IDs de curso se leen de un archivo (o de la entrada estándar con '-') en el mismo formato
+que acepta la interfaz: separados por saltos de línea, comas o espacios. Con --account se
+buscan en la cuenta (ver revisor.discover_courses) y, al revisar con un solo proceso, la
+revisión comienza con la primera página de resultados en lugar de esperar la lista completa.
+"""
+import argparse
+import csv
+import json
+import logging
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from revisor import (
+    MAX_WORKERS, SNAPSHOT_DB, apply_corrections, discover_courses, metrics, open_snapshot_store, parse_course_ids,
+    plan_corrections, review_courses,
+)
+
+# Cursos que revisa cada proceso por tarea cuando se usan varios procesos
+CHUNK_SIZE = 50
+
+CSV_FIELDS = ["course_id", "course_name", "section", "assignment", "requirement", "actual", "status", "message"]
+
+
+def review_rows(result):
+    """Convierte el resultado de revisar un curso en registros JSONL, uno por tarea revisada."""
+    course_name = (result["course_info"] or {}).get("name")
+    base = {"accion": "revisar", "course_id": result["course_id"], "course_name": course_name}
+    for error in result["errors"]:
+        yield {**base, "error": error}
+    for label, analyzed in result["sections"]:
+        if not analyzed:
+            yield {**base, "section": label, "assignment": None, "ok": False, "checks": []}
+        for name, details, third_column in analyzed:
+            checks = [
+                {"requirement": requirement, "actual": actual, "status": status}
+                for (requirement, actual), status in zip(details.items(), third_column)
+            ]
+            yield {**base, "section": label, "assignment": name,
+                   "ok": all(status == "✅" for status in third_column), "checks": checks}
+
+
+def plan_rows(plan):
+    """
+    Convierte un plan de corrección en registros JSONL: sus avisos, un registro por cambio
+    planificado y uno por escritura omitida o combinada.
+    """
+    course_name = (plan["course_info"] or {}).get("name")
+    base = {"accion": "planificar", "course_id": plan["course_id"], "course_name": course_name,
+            "assignment": plan["assignment_name"]}
+    for level, message in plan["notes"]:
+        yield {**base, "level": level, "message": message}
+    for change in plan["changes"]:
+        yield {**base, "level": "change",
+               "message": f"{change['recurso']} · {change['campo']}: {change['actual']} → {change['deseado']}"}
+    for entry in plan["coalesced"]:
+        yield {**base, "level": "coalesced", "message": f"{entry['recurso']} · {entry['campo']}: {entry['motivo']}"}
+
+
+def correction_rows(result):
+    """Convierte el resultado de corregir un curso en registros JSONL, uno por mensaje."""
+    course_name = (result["course_info"] or {}).get("name")
+    for message in result["messages"]:
+        yield {"accion": "corregir", "course_id": result["course_id"], "course_name": course_name, **message}
+
+
+def csv_rows(row):
+    """Aplana un registro JSONL en filas CSV, una por requisito revisado."""
+    base = {"course_id": row["course_id"], "course_name": row["course_name"],
+            "section": row.get("section"), "assignment": row.get("assignment")}
+    if "checks" in row and row["checks"]:
+        for check in row["checks"]:
+            yield {**base, "requirement": check["requirement"], "actual": check["actual"], "status": check["status"]}
+    elif "checks" in row:
+        yield {**base, "status": "🟥", "message": f"No hay tareas llamadas '{row['section']}'"}
+    else:
+        yield {**base, "status": row.get("level", "error"), "message": row.get("message") or row.get("error")}
+
+
+class ResultWriter:
+    """Escribe los registros en formato JSONL o CSV a medida que llegan."""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = csv.DictWriter(stream, fieldnames=CSV_FIELDS) if fmt == "csv" else None
+        if self._csv:
+            self._csv.writeheader()
+
+    def write(self, row):
+        if self._csv:
+            self._csv.writerows(csv_rows(row))
+        else:
+            self.stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+
+def _review_chunk(course_ids, workers, store_path):
+    """Revisa un grupo de cursos dentro de un proceso hijo, que abre su propia conexión al almacén."""
+    store = open_snapshot_store(store_path) if store_path else None
+    try:
+        return list(review_courses(course_ids, workers, store))
+    finally:
+        if store:
+            store.close()
+
+
+def run_review(course_ids, workers, processes, store_path=None):
+    """
+    Entrega los resultados de revisión a medida que terminan, usando hilos y opcionalmente procesos.
+    Con un solo proceso 'course_ids' puede ser un generador, que se consume a medida que avanza.
+    Con 'store_path' la revisión es incremental (ver revisor.review_course).
+    """
+    if processes <= 1:
+        yield from _iter_review(course_ids, workers, store_path)
+        return
+    course_ids = list(course_ids)
+    chunks = [course_ids[i:i + CHUNK_SIZE] for i in range(0, len(course_ids), CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_review_chunk, chunk, workers, store_path) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def _iter_review(course_ids, workers, store_path):
+    store = open_snapshot_store(store_path) if store_path else None
+    try:
+        yield from review_courses(course_ids, workers, store)
+    finally:
+        if store:
+            store.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Revisa o corrige tareas de cursos de Canvas sin interfaz gráfica.")
+    parser.add_argument("input", nargs="?", help="Archivo con IDs de curso, o '-' para leerlos de la entrada estándar")
+    parser.add_argument("--accion", choices=("revisar", "corregir"), default="revisar")
+    parser.add_argument("--output", "-o", help="Archivo de salida (por defecto, la salida estándar)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="Formato de salida (por defecto se deduce de --output, o jsonl)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Cursos revisados en paralelo por proceso")
+    parser.add_argument("--processes", type=int, default=1, help="Procesos para lotes muy grandes (solo al revisar)")
+    parser.add_argument("--dry-run", action="store_true", help="Al corregir, solo muestra los cambios planificados sin aplicarlos")
+    parser.add_argument("--incremental", action="store_true", help="Reutiliza los resultados de tareas sin cambios desde la revisión anterior")
+    parser.add_argument("--store", default=SNAPSHOT_DB, help="Archivo SQLite de la revisión incremental; al corregir, en él se registra "
+                        "la configuración aplicada y se descartan los cursos corregidos")
+    parser.add_argument("--metrics", help="Archivo JSON donde guardar la latencia por endpoint y el tiempo por curso y fase")
+    discovery = parser.add_argument_group("búsqueda de cursos", "En lugar de un archivo, revisa los cursos de una cuenta")
+    discovery.add_argument("--account", help="ID de la cuenta de Canvas cuyos cursos se revisan")
+    discovery.add_argument("--term", help="ID del periodo (enrollment_term_id)")
+    discovery.add_argument("--subaccount", action="append", help="ID de subcuenta; se puede repetir")
+    discovery.add_argument("--search", help="Texto en el nombre o código del curso (mínimo 2 caracteres)")
+    discovery.add_argument("--pattern", help="Expresión regular sobre el nombre o código del curso")
+    args = parser.parse_args(argv)
+    if (args.input is None) == (args.account is None):
+        parser.error("indique un archivo de IDs de curso o --account, pero no ambos")
+    if args.account is None and any((args.term, args.subaccount, args.search, args.pattern)):
+        parser.error("--term, --subaccount, --search y --pattern requieren --account")
+    if args.search is not None and len(args.search) < 2:
+        parser.error("--search requiere al menos 2 caracteres")
+    if args.pattern:
+        try:
+            re.compile(args.pattern)
+        except re.error as e:
+            parser.error(f"--pattern no es una expresión regular válida: {e}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    if args.account is not None:
+        course_ids = discover_courses(args.account, args.term, args.subaccount, args.search, args.pattern)
+        # Solo la revisión con un proceso se alimenta de la búsqueda a medida que avanza
+        if args.accion != "revisar" or args.processes > 1:
+            course_ids = list(course_ids)
+            logging.info(f"{len(course_ids)} cursos encontrados en la cuenta {args.account}")
+    elif args.input == "-":
+        course_ids = parse_course_ids(sys.stdin.read())
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            course_ids = parse_course_ids(f.read())
+    if not course_ids:
+        logging.error("No hay IDs de curso válidos." if args.account is None else "No se encontraron cursos con esos filtros.")
+        return 1
+    total = f"/{len(course_ids)}" if isinstance(course_ids, list) else ""
+
+    fmt = args.format or ("csv" if args.output and args.output.lower().endswith(".csv") else "jsonl")
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        writer = ResultWriter(out, fmt)
+        if args.accion == "revisar":
+            store_path = args.store if args.incremental else None
+            done = 0
+            for done, result in enumerate(run_review(course_ids, args.workers, args.processes, store_path), start=1):
+                for row in review_rows(result):
+                    writer.write(row)
+                logging.info(f"{done}{total} cursos revisados")
+            if not done:
+                logging.warning("No se encontraron cursos con esos filtros.")
+        else:
+            plans = []
+            for plan in plan_corrections(course_ids, args.workers, args.store):
+                plans.append(plan)
+                for row in plan_rows(plan):
+                    writer.write(row)
+            if not args.dry_run:
+                for result in apply_corrections(plans, args.workers, args.store):
+                    for row in correction_rows(result):
+                        writer.write(row)
+    finally:
+        if args.output:
+            out.close()
+
+    # Con varios procesos los contadores quedan en cada proceso hijo
+    if args.processes <= 1:
+        totals = metrics.counters()
+        logging.info(f"Caché de peticiones: {totals['cache_hits']} aciertos, {totals['cache_misses']} fallos. "
+                     f"Peticiones a Canvas: {totals['requests']} (costo total {totals['cost']:.1f}), "
+                     f"{totals['retries']} reintentos, {totals['wait_seconds']:.1f}s de espera por límite de tasa.")
+        if args.metrics:
+            with open(args.metrics, "w", encoding="utf-8") as f:
+                f.write(metrics.to_json(indent=2))
+    elif args.metrics:
+        logging.warning("--metrics no está disponible con --processes mayor que 1.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
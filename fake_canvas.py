@@ -0,0 +1,442 @@
+"""
+Servidor local que imita la parte de la API de Canvas que usa el revisor, para medir y probar
+sin conectarse a canvas.uautonoma.cl.
+
+Los cursos se generan a pedido a partir de su ID, con cuatro variantes que se repiten
+(según course_id % 4):
+    0  trabajo en equipo bien configurado, con equipos completos,
+    1  tarea mal configurada, con 'Project Groups' y sin 'Equipo de trabajo',
+    2  'Equipo de trabajo' sin equipos,
+    3  equipos creados, con un alumno sin equipo y otro en dos equipos.
+La cuenta (/accounts/{id}/courses) lista los cursos 1 a 'account_courses', repartidos en dos
+periodos (enrollment_term_id 1 y 2) y tres subcuentas (11, 12 y 13).
+Las escrituras (categorías, equipos, tareas y módulos) se guardan en memoria, de modo que una
+revisión posterior a 'Corregir' ve los cambios. Se puede configurar la latencia, el tamaño de
+página por defecto y la cuota del límite de tasa (headers X-Rate-Limit-Remaining y X-Request-Cost).
+
+Uso:
+    python -m fake_canvas --port 8765 --latency 0.05
+    BASE_URL=http://127.0.0.1:8765/api/v1 TOKEN=x streamlit run main.py
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+SECTIONS = (
+    # (nombre de la tarea y de su módulo, ponderación, tipo de entrega)
+    ("Foro académico 1", 20, "discussion_topic"),
+    ("Trabajo en equipo", 30, "online_upload"),
+    ("Trabajo final", 50, "online_upload"),
+)
+
+
+class FakeCanvas:
+    """Estado en memoria de los cursos falsos. Seguro para hilos."""
+
+    def __init__(self, students_per_course=30, extra_assignments=15, quota=None, refill_rate=10.0,
+                 request_cost=0.5, account_courses=200):
+        self.students_per_course = students_per_course
+        self.account_courses = account_courses
+        self.extra_assignments = extra_assignments
+        self.quota = quota
+        self.refill_rate = refill_rate
+        self.request_cost = request_cost
+        self._lock = threading.RLock()
+        self._ids = itertools.count(10_000_000)
+        self._courses = {}
+        self._categories = {}
+        self._groups = {}
+        self._remaining = quota
+        self._refilled_at = time.monotonic()
+        self.requests = 0
+
+    # --- Datos ---
+
+    def _new_id(self):
+        return next(self._ids)
+
+    def _add_category(self, course_id, name):
+        category = {"id": self._new_id(), "name": name, "course_id": course_id, "group_ids": []}
+        self._categories[category["id"]] = category
+        self._courses[course_id]["category_ids"].append(category["id"])
+        return category
+
+    def _add_group(self, category, name, members=()):
+        group = {"id": self._new_id(), "name": name, "group_category_id": category["id"], "members": list(members)}
+        self._groups[group["id"]] = group
+        category["group_ids"].append(group["id"])
+        return group
+
+    def course(self, course_id):
+        """Retorna el curso, creándolo la primera vez que se pide."""
+        with self._lock:
+            if course_id not in self._courses:
+                self._build_course(course_id)
+            return self._courses[course_id]
+
+    @staticmethod
+    def course_info(course_id):
+        return {"id": course_id, "name": f"Curso de prueba {course_id}", "course_code": f"TEST-{course_id}",
+                "enrollment_term_id": 1 + course_id % 2, "account_id": 11 + course_id % 3}
+
+    def _build_course(self, course_id):
+        variant = course_id % 4
+        students = [course_id * 1000 + i for i in range(self.students_per_course)]
+        course = self._courses[course_id] = {
+            "info": self.course_info(course_id),
+            "students": students, "assignments": {}, "assignment_groups": {}, "category_ids": [],
+        }
+        teamwork_category = None
+        if variant == 1:
+            self._add_category(course_id, "Project Groups")
+        else:
+            teamwork_category = self._add_category(course_id, "Equipo de trabajo")
+        if variant in (0, 3):
+            count = -(-len(students) // 4)
+            for i in range(count):
+                self._add_group(teamwork_category, f"Equipo de trabajo {i + 1}", students[i::count])
+            if variant == 3 and len(teamwork_category["group_ids"]) > 1:
+                first, second = (self._groups[gid] for gid in teamwork_category["group_ids"][:2])
+                first["members"].pop()
+                second["members"].append(first["members"][0])
+
+        for index, (name, weight, submission_type) in enumerate(SECTIONS, start=1):
+            group_id = course_id * 100 + index
+            course["assignment_groups"][group_id] = {"id": group_id, "name": name,
+                                                     "group_weight": weight if variant != 1 else 25}
+            assignment = {
+                "id": course_id * 100 + index, "name": name, "assignment_group_id": group_id,
+                "rubric_settings": {"title": f"Rúbrica {name}", "points_possible": 100},
+                "use_rubric_for_grading": True, "submission_types": [submission_type],
+                "allowed_attempts": -1 if submission_type == "discussion_topic" else 2,
+                "grading_type": "points", "points_possible": 100, "group_category_id": None,
+                "updated_at": "2024-03-01T12:00:00Z",
+            }
+            if submission_type == "discussion_topic":
+                assignment["discussion_topic"] = {"discussion_type": "threaded"}
+            if name == "Trabajo en equipo":
+                if variant == 1:
+                    assignment.update(allowed_attempts=1, use_rubric_for_grading=False)
+                else:
+                    assignment["group_category_id"] = teamwork_category["id"]
+            course["assignments"][assignment["id"]] = assignment
+        other_group = course_id * 100 + 9
+        course["assignment_groups"][other_group] = {"id": other_group, "name": "Otras actividades", "group_weight": 0}
+        for i in range(self.extra_assignments):
+            assignment_id = course_id * 100 + 10 + i
+            course["assignments"][assignment_id] = {
+                "id": assignment_id, "name": f"Actividad {i + 1}", "assignment_group_id": other_group,
+                "submission_types": ["none"], "points_possible": 0, "grading_type": "points",
+                "updated_at": "2024-03-01T12:00:00Z",
+            }
+
+    # --- Límite de tasa ---
+
+    def charge(self):
+        """Descuenta el costo de una petición. Retorna (cuota restante, excedida)."""
+        with self._lock:
+            self.requests += 1
+            if self.quota is None:
+                return 700.0, False
+            now = time.monotonic()
+            self._remaining = min(self.quota, self._remaining + (now - self._refilled_at) * self.refill_rate)
+            self._refilled_at = now
+            if self._remaining < self.request_cost:
+                return self._remaining, True
+            self._remaining -= self.request_cost
+            return self._remaining, False
+
+
+ROUTES = []
+
+
+def route(method, pattern):
+    def decorator(func):
+        ROUTES.append((method, re.compile(pattern), func))
+        return func
+    return decorator
+
+
+@route("GET", r"/courses/(\d+)")
+def get_course(canvas, course_id, query, body):
+    return canvas.course(course_id)["info"]
+
+
+@route("GET", r"/accounts/(\d+)/courses")
+def list_account_courses(canvas, account_id, query, body):
+    courses = (canvas.course_info(course_id) for course_id in range(1, canvas.account_courses + 1))
+    if "enrollment_term_id" in query:
+        courses = (c for c in courses if str(c["enrollment_term_id"]) == query["enrollment_term_id"][0])
+    if "by_subaccounts[]" in query:
+        courses = (c for c in courses if str(c["account_id"]) in query["by_subaccounts[]"])
+    if "search_term" in query:
+        term = query["search_term"][0].lower()
+        courses = (c for c in courses if term in c["name"].lower() or term in c["course_code"].lower())
+    return list(courses)
+
+
+@route("GET", r"/courses/(\d+)/students")
+def list_students(canvas, course_id, query, body):
+    return [{"id": sid, "name": f"Estudiante {sid}"} for sid in canvas.course(course_id)["students"]]
+
+
+@route("GET", r"/courses/(\d+)/assignments")
+def list_assignments(canvas, course_id, query, body):
+    return list(canvas.course(course_id)["assignments"].values())
+
+
+@route("GET", r"/courses/(\d+)/assignment_groups")
+def list_assignment_groups(canvas, course_id, query, body):
+    course = canvas.course(course_id)
+    groups = [dict(group) for group in course["assignment_groups"].values()]
+    if "assignments" in query.get("include[]", []):
+        for group in groups:
+            group["assignments"] = [a for a in course["assignments"].values() if a["assignment_group_id"] == group["id"]]
+    return groups
+
+
+@route("GET", r"/courses/(\d+)/assignment_groups/(\d+)")
+def get_assignment_group(canvas, course_id, group_id, query, body):
+    return canvas.course(course_id)["assignment_groups"].get(group_id)
+
+
+@route("PUT", r"/courses/(\d+)/assignment_groups/(\d+)")
+def update_assignment_group(canvas, course_id, group_id, query, body):
+    group = canvas.course(course_id)["assignment_groups"].get(group_id)
+    if group is not None:
+        group.update({key: value for key, value in body.items() if key in ("name", "group_weight")})
+    return group
+
+
+@route("PUT", r"/courses/(\d+)/assignments/(\d+)")
+def update_assignment(canvas, course_id, assignment_id, query, body):
+    assignment = canvas.course(course_id)["assignments"].get(assignment_id)
+    if assignment is None:
+        return None
+    for key, value in body.items():
+        match = re.fullmatch(r"assignment\[(\w+)\](\[\])?", key)
+        if not match:
+            continue
+        field = match[1]
+        if match[2]:
+            assignment[field] = [value]
+        elif field in ("allowed_attempts", "points_possible", "group_category_id"):
+            assignment[field] = int(value) if value not in ("", None) else None
+        elif field in ("use_rubric_for_grading", "group_assignment"):
+            assignment[field] = str(value).lower() == "true"
+        elif field in ("grading_type", "name"):
+            assignment[field] = value
+    assignment["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    return assignment
+
+
+@route("GET", r"/courses/(\d+)/group_categories")
+def list_group_categories(canvas, course_id, query, body):
+    return [{"id": cid, "name": canvas._categories[cid]["name"]} for cid in canvas.course(course_id)["category_ids"]]
+
+
+@route("POST", r"/courses/(\d+)/group_categories/?")
+def create_group_category(canvas, course_id, query, body):
+    canvas.course(course_id)
+    category = canvas._add_category(course_id, body.get("name", "Sin nombre"))
+    return {"id": category["id"], "name": category["name"]}
+
+
+@route("DELETE", r"/group_categories/(\d+)")
+def delete_group_category(canvas, category_id, query, body):
+    category = canvas._categories.pop(category_id, None)
+    if category is None:
+        return None
+    canvas._courses[category["course_id"]]["category_ids"].remove(category_id)
+    for group_id in category["group_ids"]:
+        canvas._groups.pop(group_id, None)
+    return {"id": category_id, "name": category["name"]}
+
+
+@route("GET", r"/group_categories/(\d+)/groups")
+def list_groups(canvas, category_id, query, body):
+    category = canvas._categories.get(category_id)
+    if category is None:
+        return None
+    include_users = "users" in query.get("include[]", [])
+    groups = []
+    for group_id in category["group_ids"]:
+        group = canvas._groups[group_id]
+        item = {"id": group_id, "name": group["name"], "members_count": len(group["members"])}
+        if include_users:
+            item["users"] = [{"id": sid} for sid in group["members"]]
+        groups.append(item)
+    return groups
+
+
+@route("POST", r"/group_categories/(\d+)/groups")
+def create_group(canvas, category_id, query, body):
+    category = canvas._categories.get(category_id)
+    if category is None:
+        return None
+    group = canvas._add_group(category, body.get("name", "Equipo"))
+    return {"id": group["id"], "name": group["name"]}
+
+
+@route("PUT", r"/groups/(\d+)")
+def update_group(canvas, group_id, query, body):
+    group = canvas._groups.get(group_id)
+    if group is None:
+        return None
+    if "members" in body:
+        group["members"] = [int(sid) for sid in body["members"]]
+    return {"id": group_id, "name": group["name"]}
+
+
+@route("GET", r"/groups/(\d+)/memberships")
+def list_memberships(canvas, group_id, query, body):
+    group = canvas._groups.get(group_id)
+    return None if group is None else [{"user_id": sid, "group_id": group_id} for sid in group["members"]]
+
+
+@route("POST", r"/groups/(\d+)/memberships")
+def create_membership(canvas, group_id, query, body):
+    group = canvas._groups.get(group_id)
+    if group is None:
+        return None
+    group["members"].append(int(body["user_id"]))
+    return {"user_id": int(body["user_id"]), "group_id": group_id}
+
+
+class FakeCanvasHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que los clientes reutilicen las conexiones, como con Canvas
+    protocol_version = "HTTP/1.1"
+    canvas = None
+    latency = 0.0
+    jitter = 0.0
+    default_per_page = 10
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode("utf-8") if length else ""
+        if not raw:
+            return {}
+        if "json" in (self.headers.get("Content-Type") or ""):
+            return json.loads(raw)
+        return {key: values[-1] for key, values in parse_qs(raw).items()}
+
+    def _send(self, status, data, remaining, link=None):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("X-Rate-Limit-Remaining", f"{remaining:.1f}")
+        self.send_header("X-Request-Cost", str(self.canvas.request_cost))
+        if link:
+            self.send_header("Link", link)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, method):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        body = self._body()
+        remaining, exceeded = self.canvas.charge()
+        if exceeded:
+            self._send(403, {"errors": [{"message": "Rate Limit Exceeded"}]}, remaining)
+            return
+        url = urlsplit(self.path)
+        path = url.path[len("/api/v1"):] if url.path.startswith("/api/v1") else url.path
+        query = parse_qs(url.query)
+        for route_method, pattern, func in ROUTES:
+            match = pattern.fullmatch(path)
+            if route_method == method and match:
+                with self.canvas._lock:
+                    data = func(self.canvas, *map(int, match.groups()), query, body)
+                break
+        else:
+            data = None
+        if data is None:
+            self._send(404, {"errors": [{"message": "The specified resource does not exist."}]}, remaining)
+        elif isinstance(data, list):
+            self._send_page(url, query, data, remaining)
+        else:
+            self._send(200, data, remaining)
+
+    def _send_page(self, url, query, items, remaining):
+        per_page = min(100, int(query.get("per_page", [self.default_per_page])[0]))
+        page = int(query.get("page", ["1"])[0])
+        link = None
+        if page * per_page < len(items):
+            next_query = {**query, "page": [str(page + 1)], "per_page": [str(per_page)]}
+            link = f'<http://{self.headers["Host"]}{url.path}?{urlencode(next_query, doseq=True)}>; rel="next"'
+        self._send(200, items[(page - 1) * per_page:page * per_page], remaining, link)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class FakeCanvasServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # La cola por defecto (5) descarta conexiones cuando muchos hilos se conectan a la vez
+    request_queue_size = 256
+
+    def handle_error(self, request, client_address):
+        # Los clientes que cancelan sus peticiones cierran la conexión antes de la respuesta
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def start_server(canvas=None, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, default_per_page=10):
+    """
+    Inicia el servidor en un hilo y lo retorna; 'server.server_address' indica el puerto
+    (con port=0 se elige uno libre). Se detiene con server.shutdown().
+    """
+    handler = type("Handler", (FakeCanvasHandler,), {
+        "canvas": canvas or FakeCanvas(), "latency": latency, "jitter": jitter, "default_per_page": default_per_page,
+    })
+    server = FakeCanvasServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m fake_canvas", description="Servidor local que imita la API de Canvas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="Segundos de espera por petición")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Espera aleatoria adicional máxima, en segundos")
+    parser.add_argument("--per-page", type=int, default=10, help="Tamaño de página cuando la petición no indica per_page")
+    parser.add_argument("--students", type=int, default=30, help="Estudiantes por curso")
+    parser.add_argument("--extra-assignments", type=int, default=15, help="Tareas no revisadas por curso")
+    parser.add_argument("--quota", type=float, help="Cuota del límite de tasa (sin límite si se omite)")
+    parser.add_argument("--refill-rate", type=float, default=10.0, help="Cuota recuperada por segundo")
+    parser.add_argument("--account-courses", type=int, default=200, help="Cursos que lista /accounts/{id}/courses")
+    args = parser.parse_args(argv)
+
+    canvas = FakeCanvas(args.students, args.extra_assignments, args.quota, args.refill_rate,
+                        account_courses=args.account_courses)
+    server = start_server(canvas, args.host, args.port, args.latency, args.jitter, args.per_page)
+    print(f"Canvas falso en http://{args.host}:{server.server_address[1]}/api/v1 (Ctrl+C para salir)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Métricas de una ejecución: dónde se gasta el tiempo al revisar o corregir muchos cursos.
+
+Registra, por endpoint de Canvas (con los IDs reemplazados por ':id' para agrupar las llamadas
+equivalentes de distintos cursos), la cantidad de llamadas, la latencia p50/p95, los bytes
+recibidos y las respuestas servidas o no desde la caché; por curso, el tiempo de cada fase
+(descarga, análisis, despliegue, corrección); y los totales de la ejecución (peticiones, costo,
+reintentos y espera por límite de tasa). Es segura para usarse desde varios hilos y no
+depende de Streamlit.
+
+Cada ejecución puede tener su propio Metrics: dentro de 'use_metrics' todo lo que se mide en
+ese contexto (contextvars) se registra en él, en lugar de en el Metrics por defecto del proceso.
+"""
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Fases que se miden por curso, en el orden en que se muestran
+PHASES = ("fetch", "analyze", "plan", "correct", "render")
+
+# Totales de la ejecución, además de los aciertos y fallos de caché que se suman por endpoint
+COUNTERS = ("requests", "retries", "throttled", "cost", "wait_seconds")
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+_current = contextvars.ContextVar("metrics", default=None)
+
+
+def current_metrics(default=None):
+    """Metrics de la ejecución en curso (ver use_metrics), o 'default' fuera de una."""
+    metrics = _current.get()
+    return default if metrics is None else metrics
+
+
+@contextmanager
+def use_metrics(metrics):
+    """Registra en 'metrics' lo que se mida dentro del bloque, en este contexto y en los que se copien de él."""
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def endpoint_template(url):
+    """'/api/v1/courses/123/assignments?page=2' -> '/courses/:id/assignments'."""
+    path = urlsplit(url).path
+    if path.startswith("/api/v1"):
+        path = path[len("/api/v1"):]
+    return _ID_SEGMENT.sub("/:id", path)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Metrics:
+    """Acumula las métricas de una ejecución; cada ejecución usa una instancia nueva (ver use_metrics)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+            self._courses = {}
+            self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def _endpoint(self, method, template):
+        key = (method.upper(), template)
+        entry = self._endpoints.get(key)
+        if entry is None:
+            entry = self._endpoints[key] = {"latencies": [], "bytes": 0, "errors": 0, "cache_hits": 0, "cache_misses": 0}
+        return entry
+
+    def count(self, name, amount=1):
+        """Suma 'amount' a uno de los totales de COUNTERS."""
+        with self._lock:
+            self._counters[name] += amount
+
+    def counters(self):
+        """Totales de la ejecución, con los aciertos y fallos de caché de todos los endpoints."""
+        with self._lock:
+            totals = dict(self._counters)
+            totals["cache_hits"] = sum(entry["cache_hits"] for entry in self._endpoints.values())
+            totals["cache_misses"] = sum(entry["cache_misses"] for entry in self._endpoints.values())
+        return totals
+
+    def record_request(self, method, url, seconds, nbytes, status=None):
+        """Registra una petición HTTP (con sus reintentos) a Canvas."""
+        logging.debug(f"{method.upper()} {url} -> {status} en {seconds * 1000:.0f} ms ({nbytes} bytes)")
+        with self._lock:
+            entry = self._endpoint(method, endpoint_template(url))
+            entry["latencies"].append(seconds)
+            entry["bytes"] += nbytes
+            if status is None or status >= 400:
+                entry["errors"] += 1
+
+    def record_cache_hit(self, method, endpoint):
+        """Registra una respuesta entregada por la caché sin llamar a Canvas."""
+        with self._lock:
+            self._endpoint(method, endpoint_template(endpoint))["cache_hits"] += 1
+
+    def record_cache_miss(self, method, endpoint):
+        """Registra una consulta que la caché no pudo responder."""
+        with self._lock:
+            self._endpoint(method, endpoint_template(endpoint))["cache_misses"] += 1
+
+    def add_phase(self, course_id, phase, seconds):
+        with self._lock:
+            phases = self._courses.setdefault(str(course_id), {})
+            phases[phase] = phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, course_id, phase):
+        """Mide el tiempo de pared de un bloque y lo suma a la fase 'phase' del curso."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(course_id, phase, time.perf_counter() - start)
+
+    def endpoint_stats(self):
+        """Una fila por endpoint, ordenadas por el tiempo total que consumieron."""
+        with self._lock:
+            items = [(key, dict(entry, latencies=sorted(entry["latencies"]))) for key, entry in self._endpoints.items()]
+        rows = []
+        for (method, template), entry in items:
+            latencies = entry["latencies"]
+            p50, p95 = _percentile(latencies, 0.50), _percentile(latencies, 0.95)
+            rows.append({
+                "method": method,
+                "endpoint": template,
+                "calls": len(latencies),
+                "cache_hits": entry["cache_hits"],
+                "cache_misses": entry["cache_misses"],
+                "errors": entry["errors"],
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "total_s": round(sum(latencies), 3),
+                "bytes": entry["bytes"],
+            })
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def course_stats(self):
+        """Una fila por curso con los segundos de cada fase y el total, ordenadas de más a menos lento."""
+        with self._lock:
+            courses = {course_id: dict(phases) for course_id, phases in self._courses.items()}
+        rows = []
+        for course_id, phases in courses.items():
+            row = {"course_id": course_id}
+            row.update({phase: round(phases[phase], 3) for phase in PHASES if phase in phases})
+            row["total_s"] = round(sum(phases.values()), 3)
+            rows.append(row)
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def snapshot(self):
+        return {"totals": self.counters(), "endpoints": self.endpoint_stats(), "courses": self.course_stats()}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.snapshot(), ensure_ascii=False, **kwargs)
@@ -1,535 +1,343 @@
 import streamlit as st
-import requests
 import pandas as pd
-from decouple import config
 import logging
-import unicodedata
 import re
+import threading
+from contextlib import closing
+import report
+from instrumentation import Metrics, use_metrics
+from rules import FAIL, OK
+from revisor import (
+    CACHE_TTL, CANVAS_ACCOUNT_ID, CANVAS_URL, MAX_WORKERS, CollectingReporter, apply_corrections,
+    discover_courses, open_snapshot_store, parse_course_ids, plan_corrections, request_cache,
+    review_courses, use_reporter,
+)
+
+SOURCE_IDS = "IDs de curso"
+SOURCE_ACCOUNT = "Cuenta / periodo"
 
 # Configuración de logging (opcional, puedes ajustar el nivel)
 logging.basicConfig(level=logging.INFO)
 st.set_page_config(page_title="REVISADOR y CONFIGURADOR DE TAREAS ⛑️", page_icon="⛑️")
 
-# Canvas API configuration
-BASE_URL = "https://canvas.uautonoma.cl/api/v1"
-API_TOKEN = config("TOKEN")
-HEADERS = {
-    "Authorization": f"Bearer {API_TOKEN}",
-    "Content-Type": "application/json"   # Por defecto se usa JSON en otras llamadas
-}
-
-# Crear una sesión de requests para mejorar el rendimiento en múltiples llamadas
-session = requests.Session()
-session.headers.update(HEADERS)
-
-def clean_string(input_string: str) -> str:
-    cleaned = input_string.strip().lower()
-    cleaned = unicodedata.normalize('NFD', cleaned)
-    cleaned = re.sub(r'[^\w\s.,!?-]', '', cleaned)
-    cleaned = re.sub(r'[\u0300-\u036f]', '', cleaned)
-    return cleaned
-
-def canvas_request(method, endpoint, payload=None):
-    """
-    Realiza peticiones a la API de Canvas de forma centralizada.
-    
-    :param method: Método HTTP ('get', 'post', 'put', 'delete')
-    :param endpoint: Endpoint de la API (por ejemplo, "/courses/123/assignments")
-    :param payload: Datos a enviar (para POST/PUT)
-    :return: La respuesta en formato JSON o None en caso de error
-    """
-    url = f"{BASE_URL}{endpoint}"
-    try:
-        if method.lower() == "get":
-            response = session.get(url)
-        elif method.lower() == "post":
-            response = session.post(url, json=payload)
-        elif method.lower() == "put":
-            response = session.put(url, json=payload)
-        elif method.lower() == "delete":
-            response = session.delete(url)
-        else:
-            st.error("Método HTTP no soportado")
-            return None
-
-        if not response.ok:
-            st.error(f"Error en la petición a {url} ({response.status_code}): {response.text}")
-            return None
-
-        if response.text:
-            return response.json()
-        else:
-            return None
-
-    except requests.exceptions.RequestException as e:
-        st.error(f"Excepción en la petición a {url}: {e}")
-        return None
-
-def parse_course_ids(input_text):
-    """Limpia y procesa el input para extraer los course IDs."""
-    cleaned = input_text.replace(",", "\n").replace(" ", "\n")
-    return list(filter(None, map(lambda x: x.strip(), cleaned.split("\n"))))
-
-def get_assignments(course_id):
-    """Obtiene todas las tareas de un curso."""
-    return canvas_request("get", f"/courses/{course_id}/assignments") or []
-
-def check_group_categories(course_id):
-    """Obtiene y verifica las categorías de grupo de un curso."""
-    group_categories_response = canvas_request("get", f"/courses/{course_id}/group_categories")
-    if group_categories_response is None:
-        return None
-
-    group_categories = group_categories_response
-
-    trabajo_en_equipo = next((gc for gc in group_categories if gc.get("name") == "Equipo de trabajo"), None)
-    project_groups = next((gc for gc in group_categories if gc.get("name") == "Project Groups"), None)
-
-    return {
-        "Equipo de trabajo": {
-            "exists": trabajo_en_equipo is not None,
-            "id": trabajo_en_equipo["id"] if trabajo_en_equipo else None,
-        },
-        "Project Groups": {
-            "exists": project_groups is not None,
-            "id": project_groups["id"] if project_groups else None,
-        }
-    }
-
-def get_rubric_details(course_id, assignment):
-    """Obtiene detalles de la rúbrica asociada a una tarea."""
-    if assignment.get("rubric_settings"):
-        rubric_used_for_grading = assignment.get("use_rubric_for_grading")
-        rubric_settings = assignment["rubric_settings"]
-        return {
-            "has_rubric": True,
-            "rubric_points": rubric_settings.get("points_possible"),
-            "rubric_used_for_grading": rubric_used_for_grading,
-            "name": rubric_settings.get("title")
-        }
-    return {"has_rubric": False, "rubric_points": None, "rubric_used_for_grading": False}
-
-def get_module_name(course_id: str, assignment_group_id: str):
-    """Obtiene el nombre, peso e id del módulo (assignment group) de la tarea."""
-    response = canvas_request("get", f"/courses/{course_id}/assignment_groups/{assignment_group_id}")
-    if response and isinstance(response, dict):
-        return {
-            "name": response.get("name"),
-            "weight": response.get("group_weight"),
-            "id": response.get("id")
-        }
-    else:
-        return None
-
-def distribuir_estudiantes(student_ids, min_size, max_size):
-    """
-    Distribuye los estudiantes en equipos cumpliendo con el tamaño mínimo y máximo.
-    Se retorna una lista de listas, donde cada sublista representa un equipo.
-    """
-    teams = [student_ids[i:i + max_size] for i in range(0, len(student_ids), max_size)]
-    
-    # Ajustar equipos si el último tiene menos del tamaño mínimo
-    while len(teams) > 1 and len(teams[-1]) < min_size:
-        deficit = min_size - len(teams[-1])
-        for i in range(deficit):
-            extraido = False
-            # Buscar en los equipos anteriores un estudiante que se pueda mover
-            for j in range(len(teams) - 2, -1, -1):
-                if len(teams[j]) > min_size:
-                    teams[-1].append(teams[j].pop())
-                    extraido = True
-                    break
-            if not extraido:
-                break
-
-    # Garantizar que ningún equipo tenga más de max_size estudiantes
-    for i in range(len(teams)):
-        while len(teams[i]) > max_size:
-            if i + 1 < len(teams):
-                teams[i+1].insert(0, teams[i].pop())
-            else:
-                teams.append([teams[i].pop()])
-
-    return teams
-
-def assign_students_to_teams(course_id, group_category_id, min_size=3, max_size=4):
-    """
-    Crea equipos en Canvas y asigna a cada estudiante a un equipo.
-    Se utiliza la función 'distribuir_estudiantes' para dividir los IDs de los estudiantes.
-    """
-    students_response = canvas_request("get", f"/courses/{course_id}/students")
-    if students_response is None:
-        return
-
-    student_ids = [student["id"] for student in students_response]
-    
-    teams = distribuir_estudiantes(student_ids, min_size, max_size)
-    
-    for idx, team in enumerate(teams):
-        group_name = f"Equipo de trabajo {idx + 1}"
-        create_payload = {"name": group_name}
-        group_response = canvas_request("post", f"/group_categories/{group_category_id}/groups", create_payload)
-        if group_response is None:
-            continue
-
-        group_id = group_response.get("id")
-        st.info(f"Equipo '{group_name}' creado exitosamente con ID {group_id}.")
-        for student_id in team:
-            membership_payload = {"user_id": student_id}
-            membership_response = canvas_request("post", f"/groups/{group_id}/memberships", membership_payload)
-            if membership_response is None:
-                st.error(f"Error al asignar al estudiante {student_id} al equipo '{group_name}'.")
-            else:
-                st.success(f"Estudiante {student_id} asignado al equipo '{group_name}'.")
-
-    st.success("Todos los estudiantes han sido asignados a equipos exitosamente.")
-
-def check_team_assignments(course_id):
-    """
-    Verifica si se han creado equipos y si todos los estudiantes están asignados a un equipo
-    en la categoría 'Equipo de trabajo'.
-    """
-    group_categories = canvas_request("get", f"/courses/{course_id}/group_categories")
-    if not group_categories:
-        return None
-
-    equipo_de_trabajo = next((gc for gc in group_categories if gc.get("name") == "Equipo de trabajo"), None)
-    if not equipo_de_trabajo:
-        return {"teams_created": False, "all_assigned": False}
-    
-    group_category_id = equipo_de_trabajo["id"]
-    groups = canvas_request("get", f"/group_categories/{group_category_id}/groups")
-    if not groups:
-        return {"teams_created": False, "all_assigned": False}
-
-    students_response = canvas_request("get", f"/courses/{course_id}/students")
-    if not students_response:
-        return None
-    
-    student_ids = {student["id"] for student in students_response}
-    assigned_student_ids = set()
-
-    for group in groups:
-        memberships = canvas_request("get", f"/groups/{group['id']}/memberships")
-        if memberships:
-            assigned_student_ids.update(m.get("user_id") for m in memberships)
-
-    all_assigned = student_ids.issubset(assigned_student_ids)
-    return {
-        "teams_created": True,
-        "all_assigned": all_assigned,
-        "unassigned_students": student_ids - assigned_student_ids,
-        "total_students": student_ids
-    }
-
-def analyze_assignment_teamwork(course_id, assignment):
-    """Analiza la tarea aplicando varios criterios y retorna los detalles."""
-    rubric_details = get_rubric_details(course_id, assignment)
-    group_categories_check = check_group_categories(course_id)
-    module_info = get_module_name(course_id, assignment.get("assignment_group_id"))
-    team_options = check_team_assignments(course_id)
-    
-    third_column = []
-    third_column.append("✅" if rubric_details["has_rubric"] else "🟥")
-    third_column.append("✅" if rubric_details["rubric_points"] == 100 else "🟥")
-    third_column.append("✅" if rubric_details["rubric_used_for_grading"] else "🟥")
-    third_column.append("✅" if assignment.get("submission_types") == ["online_upload"] else "🟥")
-    third_column.append("✅" if assignment.get("allowed_attempts") == 2 else "🟥")
-    third_column.append("✅" if assignment.get("grading_type") == "points" else "🟥")
-    third_column.append("✅" if assignment.get("points_possible") == 100 else "🟥")
-    third_column.append("✅" if int(module_info['weight']) == 30 else "🟥")
-    third_column.append("✅" if clean_string(module_info["name"]) == clean_string(assignment.get("name")) else "🟥")
-    third_column.append("✅" if assignment.get("group_category_id") else "🟥")
-    third_column.append("✅" if group_categories_check["Equipo de trabajo"]["exists"] else "🟥")
-    third_column.append("✅" if not group_categories_check["Project Groups"]["exists"] else "🟥")
-    third_column.append("✅" if team_options != None  and team_options['teams_created'] else "🟥")
-    third_column.append("✅" if team_options != None and team_options['all_assigned'] else "🟥")
-
-    return {
-        "Tiene rubrica": rubric_details["name"] if third_column[0] == "✅" else "NO TIENE (Requiere configuracion manual)",
-        "Puntos rubrica": str(int(rubric_details["rubric_points"]) if rubric_details["has_rubric"] else "NO TIENE (Requiere configuracion manual)"),
-        "Usa rubrica para calificar": "SI" if third_column[2] == "✅" else "NO",
-        "Tipo de entrega": "En linea" if third_column[3] == "✅" else "Otro",
-        "Intentos permitidos": str(assignment.get("allowed_attempts")),
-        "Tipo de calificacion": "Puntos" if  third_column[5] == "✅" else "Otro",
-        "Puntos posibles": str(int(assignment.get("points_possible"))),
-        "Ponderacion": str(f"{int(module_info['weight'])}%"),
-        "Modulo": str(module_info["name"]),
-        "Es trabajo en grupo": "SI" if third_column[9] == "✅" else "NO",
-        "Existe Equipo de trabajo": "SI" if third_column[10] == "✅" else "NO",
-        "Existe Project Groups": "SI" if third_column[11] == "✅" else "NO",
-        "Equipos creados": "SI" if third_column[12] == "✅" else "NO",
-        "Alumnos Asignados": f"SI" if third_column[13] == "✅" else f"NO ({len(team_options['unassigned_students'])} sin asignar)",
-    }, third_column
-    
-def analyze_assignment_forum(course_id, assignment):
-    """Analiza la tarea aplicando varios criterios y retorna los detalles."""
-    rubric_details = get_rubric_details(course_id, assignment)
-    module_info = get_module_name(course_id, assignment.get("assignment_group_id"))
-    
-    third_column = []
-    third_column.append("✅" if rubric_details["has_rubric"] else "🟥")
-    third_column.append("✅" if rubric_details["rubric_points"] == 100 else "🟥")
-    third_column.append("✅" if rubric_details["rubric_used_for_grading"] else "🟥")
-    third_column.append("✅" if assignment.get("submission_types") == ['discussion_topic'] else "🟥")
-    third_column.append("✅" if assignment.get("allowed_attempts") == -1 else "🟥")
-    third_column.append("✅" if assignment.get("grading_type") == "points" else "🟥")
-    third_column.append("✅" if assignment.get("points_possible") == 100 else "🟥")
-    third_column.append("✅" if int(module_info['weight']) == 20 else "🟥")
-    third_column.append("✅" if clean_string(module_info["name"]) == clean_string(assignment.get("name")) else "🟥")
-    third_column.append("✅" if assignment.get('discussion_topic').get("discussion_type") == "threaded" else "🟥")
-
-    return {
-        "Tiene rubrica": rubric_details["name"] if third_column[0] == "✅" else "NO TIENE (Requiere configuracion manual)",
-        "Puntos rubrica": str(int(rubric_details["rubric_points"]) if rubric_details["has_rubric"] else "NO TIENE (Requiere configuracion manual)"),
-        "Usa rubrica para calificar": "SI" if third_column[2] == "✅" else "NO",
-        "Tipo de entrega": "En linea" if third_column[3] == "✅" else "Otro",
-        "Intentos permitidos": "Ilimitado" if assignment.get("allowed_attempts") == -1 else str(assignment.get("allowed_attempts")),
-        "Tipo de calificacion": "Puntos" if  third_column[5] == "✅" else "Otro",
-        "Puntos posibles": str(int(assignment.get("points_possible"))),
-        "Ponderacion": str(f"{int(module_info['weight'])}%"),
-        "Modulo": str(module_info["name"]),
-        "Desactivar respuestas hilvadanas": "SI" if third_column[9] == "✅" else "NO"
-    }, third_column
- 
-def analyze_assignment_finalwork(course_id, assignment):
-    """Analiza la tarea aplicando varios criterios y retorna los detalles."""
-    rubric_details = get_rubric_details(course_id, assignment)
-    module_info = get_module_name(course_id, assignment.get("assignment_group_id"))
-    
-    third_column = []
-    third_column.append("✅" if rubric_details["has_rubric"] else "🟥")
-    third_column.append("✅" if rubric_details["rubric_points"] == 100 else "🟥")
-    third_column.append("✅" if rubric_details["rubric_used_for_grading"] else "🟥")
-    third_column.append("✅" if assignment.get("submission_types") == ["online_upload"] else "🟥")
-    third_column.append("✅" if assignment.get("allowed_attempts") == 2 else "🟥")
-    third_column.append("✅" if assignment.get("grading_type") == "points" else "🟥")
-    third_column.append("✅" if assignment.get("points_possible") == 100 else "🟥")
-    third_column.append("✅" if int(module_info['weight']) == 50 else "🟥")
-    third_column.append("✅" if clean_string(module_info["name"]) == clean_string(assignment.get("name")) else "🟥")
-    third_column.append("✅" if assignment.get("group_category_id") is None else "🟥")
-
-    return {
-        "Tiene rubrica": rubric_details["name"] if third_column[0] == "✅" else "NO TIENE (Requiere configuracion manual)",
-        "Puntos rubrica": str(int(rubric_details["rubric_points"]) if rubric_details["has_rubric"] else "NO TIENE (Requiere configuracion manual)"),
-        "Usa rubrica para calificar": "SI" if third_column[2] == "✅" else "NO",
-        "Tipo de entrega": "En linea" if third_column[3] == "✅" else "Otro",
-        "Intentos permitidos": str(assignment.get("allowed_attempts")),
-        "Tipo de calificacion": "Puntos" if  third_column[5] == "✅" else "Otro",
-        "Puntos posibles": str(int(assignment.get("points_possible"))),
-        "Ponderacion": str(f"{int(module_info['weight'])}%"),
-        "Modulo": str(module_info["name"]),
-        "Es trabajo en grupo": "NO" if third_column[9] == "✅" else "SI",
-    }, third_column
-    
 def display_details_as_table(details, estado):
     """Muestra los detalles en forma de tabla usando pandas."""
     data = {"Requerimiento": list(details.keys()), "Actual": list(details.values()), "Estado":estado}
     df = pd.DataFrame(data)
     st.table(df)
 
-def flatten_assignment_payload(nested_payload):
-    """
-    Transforma un payload anidado en uno plano con claves que sigan el formato que espera Canvas.
-    Por ejemplo, transforma:
-       {"assignment": {"grading_type": "points", "submission_types": ["online_upload"], ...}}
-    en:
-       {"assignment[grading_type]": "points",
-        "assignment[submission_types][]": "online_upload",
-        "assignment[submission_type]": "online",
-        ... }
-    """
-    assignment_data = nested_payload.get("assignment", {})
-    flat = {}
-    # Se asume que submission_types es una lista; se envía el primer valor
-    if "submission_types" in assignment_data:
-        flat["assignment[submission_types][]"] = assignment_data["submission_types"][0] if assignment_data["submission_types"] else ""
-    # Se agrega un valor fijo para submission_type
-    flat["assignment[submission_type]"] = "online"
-    # Para el resto de claves
-    for key, value in assignment_data.items():
-        if key == "submission_types":
-            continue  # ya se procesó
-        flat[f"assignment[{key}]"] = value
-    # Si no se especifica, se puede incluir group_assignment como true
-    if "group_assignment" not in assignment_data:
-        flat["assignment[group_assignment]"] = True
-    return flat
-
-def update_assignment(course_id, assignment_id, payload):
-    """Actualiza la configuración de una tarea utilizando payload en formato form-encoded."""
-    endpoint = f"/courses/{course_id}/assignments/{assignment_id}"
-    url = f"{BASE_URL}{endpoint}"
-    flat_payload = flatten_assignment_payload(payload)
-    headers_form = HEADERS.copy()
-    headers_form["Content-Type"] = "application/x-www-form-urlencoded"
-    try:
-        response = session.put(url, data=flat_payload, headers=headers_form)
-        if response.ok:
-            st.success("Opciones del trabajo en grupo corregidos!")
-            return response.json()
-        else:
-            st.error(f"Error al actualizar la tarea: {response.text}")
-            return None
-    except requests.exceptions.RequestException as e:
-        st.error(f"Excepción al actualizar la tarea: {e}")
-        return None
-
-def update_group(course_id: str, assignment_group_id: str, payload):
-    """Actualiza la configuración de un grupo (módulo)."""
-    response = canvas_request("put", f"/courses/{course_id}/assignment_groups/{assignment_group_id}", payload)
-    if response:
-        st.success("Opciones del grupo corregidas!")
-        return True
-    else:
-        return False
+def render_course_header(course_id, course_info):
+    """Muestra el encabezado del curso con el enlace a sus tareas."""
+    course_info = course_info or {}
+    st.markdown(f"##### [{course_info.get('name')} - ({course_info.get('id')}) - {course_info.get('course_code')}]({CANVAS_URL}/courses/{course_id}/assignments)", unsafe_allow_html=True)
+
+def course_review_summary(result):
+    """Retorna (tareas que cumplen, tareas con fallas, secciones sin tareas) de la revisión de un curso."""
+    passed = failed = missing = 0
+    for _, analyzed in result["sections"]:
+        if not analyzed:
+            missing += 1
+        for _, _, third_column in analyzed:
+            if all(status == OK for status in third_column):
+                passed += 1
+            else:
+                failed += 1
+    return passed, failed, missing
 
-def correct_teamwork_assignment(course_id):
+def render_course_review(result):
     """
-    Realiza las correcciones necesarias a la tarea 'Trabajo en equipo',
-    actualizando la tarea, el módulo y la categoría de grupo según corresponda.
+    Muestra en la página el resultado de revisar un curso: una fila de resumen y, por tarea,
+    un interruptor que muestra su tabla de requerimientos. A diferencia de un expander, que envía
+    su contenido al navegador aunque esté cerrado, la tabla solo se construye si se pide.
     """
-    assignments = get_assignments(course_id)
-    teamwork_assignments = [a for a in assignments if "trabajo en equipo" in a["name"].lower()]
-    if not teamwork_assignments:
-        st.info(f"No hay tareas 'Trabajo en equipo' en el curso {course_id}.")
-        return
-
-    # Se utiliza la primera tarea encontrada para corrección.
-    teamwork_assignment = teamwork_assignments[0]
-    correct_module = get_module_name(course_id, teamwork_assignment.get("assignment_group_id"))
-    correct_group_categories = check_group_categories(course_id)
-    correct_teams = check_team_assignments(course_id)
-    
-    payload_assignment = {}
-    payload_modules = {}
-    payload_group_categories = {}
-    
-    # Correcciones en la tarea
-    if not teamwork_assignment.get("rubric_settings"):
-        st.warning("Sin rúbrica asociada, la corrección debe ser realizada manualmente.")
-    else:
-        if teamwork_assignment["rubric_settings"].get("points_possible") != 100:
-            st.warning(f"Esta rúbrica tiene el puntaje máximo mal configurado ({teamwork_assignment['rubric_settings']['points_possible']}).")
-        if not teamwork_assignment.get("use_rubric_for_grading"):
-            payload_assignment["use_rubric_for_grading"] = True
-    
-    if teamwork_assignment.get("grading_type") != "points":
-        payload_assignment["grading_type"] = "points"
-    
-    if teamwork_assignment.get("submission_types") != ["online_upload"]:
-        payload_assignment["submission_types"] = ["online_upload"]
-    
-    if teamwork_assignment.get("allowed_attempts") != 2:
-        payload_assignment["allowed_attempts"] = 2
-
-    if teamwork_assignment.get("points_possible") != 100:
-        payload_assignment["points_possible"] = 100
-    
-    # Correcciones en el módulo (assignment group)
-    if correct_module and correct_module.get("name") != teamwork_assignment.get("name"):
-        payload_modules["name"] = teamwork_assignment.get("name")
-        
-    if correct_module and correct_module.get("weight") != 30:
-        payload_modules["weight"] = 30
-
-    # Correcciones en las categorías de grupo: eliminar 'Project Groups' si existe.
-    if correct_group_categories and correct_group_categories["Project Groups"]["exists"]:
-        response = canvas_request("delete", f"/group_categories/{correct_group_categories['Project Groups']['id']}")
-        if response is not None:
-            st.info("Eliminado 'Project Groups'.")
-        else:
-            st.error("Error al eliminar 'Project Groups'.")
-
-    new_group_category_id = None      
-    if not correct_group_categories or not correct_group_categories["Equipo de trabajo"]["exists"]:
-        payload_group_categories["name"] = "Equipo de trabajo"
-        payload_group_categories["self_signup"] = "disabled"
-        payload_group_categories["auto_leader"] = "random"
-        
-        response = canvas_request("post", f"/courses/{course_id}/group_categories/", payload_group_categories)
-        if response:
-            new_group_category_id = response.get("id")
-            payload_assignment["group_category_id"] = new_group_category_id
-        else:
-            st.warning("No se pudo crear la categoría 'Equipo de trabajo'.")
+    course_id = result["course_id"]
+    render_course_header(course_id, result["course_info"])
+    passed, failed, missing = course_review_summary(result)
+    st.caption(f"{OK} {passed} tareas cumplen · {FAIL} {failed} con fallas · {missing} secciones sin tareas"
+               + (f" · {len(result['errors'])} errores" if result["errors"] else ""))
+    for error in result["errors"]:
+        st.error(error)
+    for label, analyzed in result["sections"]:
+        if not analyzed:
+            st.info(f"No hay tareas llamadas '{label}' en el curso {course_id}.")
+            continue
+        for index, (name, details, third_column) in enumerate(analyzed):
+            failures = sum(status != OK for status in third_column)
+            title = f"{OK} Tarea: {name}" if not failures else f"{FAIL} Tarea: {name} ({failures} requerimientos sin cumplir)"
+            if st.toggle(title, key=f"detalle-{course_id}-{label}-{index}"):
+                display_details_as_table(details, third_column)
+    st.divider()
+
+def discover_from_inputs(account_id, term_id, subaccounts, search_term, name_pattern):
+    """Valida los filtros de búsqueda y retorna el generador de discover_courses; lanza ValueError si no son válidos."""
+    account_id, term_id, search_term = account_id.strip(), term_id.strip(), search_term.strip()
+    if not account_id.isdigit():
+        raise ValueError("El ID de cuenta debe ser numérico.")
+    if term_id and not term_id.isdigit():
+        raise ValueError("El ID de periodo debe ser numérico.")
+    if len(search_term) == 1:
+        raise ValueError("La búsqueda por nombre o código requiere al menos 2 caracteres.")
+    try:
+        re.compile(name_pattern)
+    except re.error as e:
+        raise ValueError(f"Expresión regular no válida: {e}")
+    return discover_courses(account_id, term_id or None, parse_course_ids(subaccounts), search_term or None,
+                            name_pattern or None)
+
+def refreshed(course_ids):
+    """Descarta de la caché las respuestas de cada curso justo antes de entregarlo, para volver a leerlo de Canvas."""
+    for course_id in course_ids:
+        request_cache.invalidate(course_id)
+        yield course_id
+
+def collect_errors(iterable, reporter):
+    """Recorre 'iterable' enviando a 'reporter' los errores que genere cada paso (p. ej., al descargar una página)."""
+    iterator = iter(iterable)
+    while True:
+        with use_reporter(reporter):
+            item = next(iterator, None)
+        if item is None:
+            return
+        yield item
+
+def render_review(review):
+    """Vuelve a mostrar una revisión guardada en la sesión, en el orden en que se ingresaron los cursos."""
+    results = review["results"]
+    if not review["complete"]:
+        st.warning(f"Revisión cancelada: {len(results)} de {len(review['course_ids'])} cursos revisados.")
+    for course_id in review["course_ids"]:
+        if course_id in results:
+            render_course_review(results[course_id])
+
+def render_catalogue(catalogue):
+    """Muestra el reporte agregado con filtros, el resumen por curso y las descargas."""
+    compliance, errors = catalogue["compliance"], catalogue["errors"]
+    for error in errors:
+        st.error(error)
+
+    st.markdown("##### Resumen por curso")
+    st.dataframe(report.course_summary(compliance), hide_index=True, use_container_width=True)
+
+    st.markdown("##### Detalle por tarea")
+    col_sections, col_failing = st.columns([3, 1])
+    sections = col_sections.multiselect("Secciones", sorted(compliance["section"].dropna().unique()))
+    only_failing = col_failing.checkbox("Solo con fallas")
+    course_filter = st.text_input("Filtrar por curso (ID o nombre)")
+    filtered = compliance
+    if sections:
+        filtered = filtered[filtered["section"].isin(sections)]
+    if only_failing:
+        filtered = filtered[~filtered["cumple"]]
+    if course_filter:
+        filtered = filtered[filtered["course_id"].astype(str).str.contains(course_filter, case=False, regex=False)
+                            | filtered["course_name"].fillna("").str.contains(course_filter, case=False, regex=False)]
+    status = report.as_status(filtered)
+    st.dataframe(status, hide_index=True, use_container_width=True)
+
+    col_csv, col_parquet = st.columns(2)
+    col_csv.download_button("Descargar CSV", report.to_csv_bytes(status), "cumplimiento.csv", "text/csv")
+    parquet = report.to_parquet_bytes(filtered)
+    if parquet is not None:
+        col_parquet.download_button("Descargar Parquet", parquet, "cumplimiento.parquet", "application/octet-stream")
+
+def render_messages(messages):
+    """Muestra los mensajes acumulados por un CollectingReporter."""
+    details = [m["message"] for m in messages if m["level"] == "detail"]
+    for message in messages:
+        if message["level"] != "detail":
+            getattr(st, message["level"])(message["message"])
+    if details:
+        with st.expander("Ver detalles"):
+            for line in details:
+                st.write(line)
+
+def render_correction_plans(plans):
+    """Muestra el plan de corrección de cada curso (dry-run) antes de aplicarlo."""
+    st.markdown("##### Cambios planificados")
+    changes = [
+        {"curso": plan["course_id"], "tarea": plan["assignment_name"], **change}
+        for plan in plans for change in plan["changes"]
+    ]
+    if changes:
+        st.dataframe(pd.DataFrame(changes), hide_index=True, use_container_width=True)
     else:
-        payload_assignment["group_category_id"] = correct_group_categories["Equipo de trabajo"]["id"]
-    
-    # Si no se han creado equipos, asignar estudiantes a equipos.
-    if correct_teams is None or not correct_teams.get("teams_created"):
-        group_category_id = new_group_category_id if new_group_category_id else (correct_group_categories["Equipo de trabajo"]["id"] if correct_group_categories else None)
-        if group_category_id:
-            assign_students_to_teams(course_id, group_category_id, 3, 4)
-        else:
-            st.error("No se encontró o creó una categoría de grupo válida.")
-    
-    # Agregar configuración para Turnitin (revisión de similitud)
-    payload_assignment["similarityDetectionTool"] = "Lti::MessageHandler_123"
-    payload_assignment["configuration_tool_type"] = "Lti::MessageHandler"
-    payload_assignment["report_visibility"] = "immediate"
-    
-    # Se prepara el payload final dentro de la clave "assignment"
-    final_assignment_payload = {"assignment": payload_assignment}
-    
-    if payload_assignment:
-        update_assignment(course_id, teamwork_assignment.get("id"), final_assignment_payload)
-    if payload_modules and correct_module:
-        update_group(course_id, correct_module["id"], payload_modules)
+        st.info("No hay cambios que aplicar.")
+    coalesced = [
+        {"curso": plan["course_id"], "tarea": plan["assignment_name"], **entry}
+        for plan in plans for entry in plan["coalesced"]
+    ]
+    if coalesced:
+        with st.expander(f"Escrituras omitidas o combinadas ({len(coalesced)})"):
+            st.dataframe(pd.DataFrame(coalesced), hide_index=True, use_container_width=True)
+    for plan in plans:
+        if plan["notes"]:
+            render_course_header(plan["course_id"], plan["course_info"])
+            for level, message in plan["notes"]:
+                getattr(st, level)(message)
+
+def render_run_stats(metrics):
+    """Muestra los contadores de la caché y del cliente HTTP de la ejecución, y sus métricas detalladas."""
+    totals = metrics.counters()
+    st.caption(f"Caché de peticiones: {totals['cache_hits']} aciertos, {totals['cache_misses']} fallos.")
+    st.caption(f"Peticiones a Canvas: {totals['requests']} (costo total {totals['cost']:.1f}), "
+               f"{totals['retries']} reintentos, {totals['wait_seconds']:.1f}s de espera por límite de tasa.")
+    with st.expander("Métricas de la ejecución"):
+        st.markdown("##### Peticiones por endpoint")
+        st.dataframe(pd.DataFrame(metrics.endpoint_stats()), hide_index=True, use_container_width=True)
+        st.markdown("##### Tiempo por curso y fase (segundos)")
+        st.dataframe(pd.DataFrame(metrics.course_stats()), hide_index=True, use_container_width=True)
+        st.download_button("Descargar métricas (JSON)", metrics.to_json(indent=2), "metricas.json", "application/json")
 
 def main():
     st.title("REVISADOR y CONFIGURADOR DE TAREAS ⛑️")
-    st.write("Ingresa uno o más IDs de curso:")
-
-    input_ids = st.text_area("Course IDs", height=100)
+    source = st.radio("Origen de los cursos:", (SOURCE_IDS, SOURCE_ACCOUNT), horizontal=True)
+    if source == SOURCE_IDS:
+        st.write("Ingresa uno o más IDs de curso:")
+        input_ids = st.text_area("Course IDs", height=100)
+    else:
+        st.write("Se revisan los cursos de la cuenta a medida que Canvas los entrega:")
+        col_account, col_term = st.columns(2)
+        account_id = col_account.text_input("ID de cuenta", value=CANVAS_ACCOUNT_ID)
+        term_id = col_term.text_input("ID de periodo (enrollment_term_id, opcional)")
+        subaccounts = st.text_input("IDs de subcuentas (opcional, separados por comas)")
+        col_search, col_pattern = st.columns(2)
+        search_term = col_search.text_input("Buscar en nombre o código (opcional)")
+        name_pattern = col_pattern.text_input("Expresión regular sobre nombre o código (opcional)")
 
     accion = st.radio("Seleccione una acción:", ("Revisar", "Corregir"))
+    max_workers = st.number_input("Cursos revisados en paralelo", min_value=1, max_value=32, value=MAX_WORKERS)
+    incremental = st.checkbox("Revisión incremental (reutilizar resultados de tareas sin cambios)", value=False)
+    aggregated = st.checkbox("Vista agregada (un solo reporte para todos los cursos)", value=False)
+    # La caché de peticiones vive en el proceso, por lo que sobrevive a los reruns, al cambio de acción y
+    # se comparte con otras sesiones; las correcciones y este control descartan solo las respuestas de sus cursos
+    reuse_cache = st.checkbox(f"Reutilizar datos de Canvas descargados en los últimos {CACHE_TTL // 60} minutos", value=True)
     
-    if st.button("Ejecutar"):
+    executed = st.button("Ejecutar")
+    if executed:
         st.divider()
-        course_ids = parse_course_ids(input_ids)
-        if not course_ids:
-            st.warning("No hay IDs de curso válidos.")
-        else:
-            for course_id in course_ids:
-                course_info = canvas_request('get', f"/courses/{course_id}")
-                is_massive = False
-                st.markdown(f"##### [{course_info.get('name')} - ({course_info.get('id')}) - {course_info.get('course_code')}](https://canvas.uautonoma.cl/courses/{course_id}/assignments)", unsafe_allow_html=True)
-                if accion == "Revisar":
-                    assignments = get_assignments(course_id)
-                    forum_assignments = [a for a in assignments if "foro academico" in clean_string(a["name"].lower())]
-                    teamwork_assignments = [a for a in assignments if "trabajo en equipo" in clean_string(a["name"].lower())]
-                    final_assignments = [a for a in assignments if "trabajo final" in clean_string(a["name"].lower())]
-                    #comprobando foro academico
-                    if not forum_assignments:
-                        st.info(f"No hay tareas llamadas 'Foro academico' en el curso {course_id}.")
-                        # continue
-                    else:
-                        for assignment in forum_assignments:
-                            st.write(f"##### Tarea: {assignment['name']}")
-                            details, third_column = analyze_assignment_forum(course_id, assignment)
-                            display_details_as_table(details, third_column)
-                    #comprobando trabajo en equipo
-                    if not teamwork_assignments:
-                        st.info(f"No hay tareas llamadas 'Trabajo en equipo' en el curso {course_id}.")
-                    else:
-                        # continue
-                        for assignment in teamwork_assignments:
-                            st.write(f"##### Tarea: {assignment['name']}")
-                            details, third_column = analyze_assignment_teamwork(course_id, assignment)
-                            display_details_as_table(details, third_column)
-                    #comprobando trabajo final
-                    if not final_assignments:
-                        st.info(f"No hay tareas llamadas 'Trabajo final' en el curso {course_id}.")
-                    else:
-                        # continue
-                        for assignment in final_assignments:
-                            st.markdown(f"##### Tarea: {assignment['name']}")
-                            details, third_column = analyze_assignment_finalwork(course_id, assignment)
-                            display_details_as_table(details, third_column)
-                            st.divider()
-                else:  # acción "Corregir"
-                    correct_teamwork_assignment(course_id)
+        # Cada ejecución tiene sus propias métricas; otras sesiones pueden estar ejecutando a la vez
+        run_metrics = Metrics()
+        with use_metrics(run_metrics):
+            discovery_log = CollectingReporter()
+            if source == SOURCE_IDS:
+                course_ids = parse_course_ids(input_ids)
+                no_courses = "No hay IDs de curso válidos."
+            else:
+                no_courses = "No se encontraron cursos con esos filtros."
+                try:
+                    course_ids = collect_errors(
+                        discover_from_inputs(account_id, term_id, subaccounts, search_term, name_pattern), discovery_log)
+                except ValueError as e:
+                    course_ids, no_courses = [], str(e)
+                # Solo la revisión por curso se alimenta de la búsqueda a medida que avanza; el resto necesita la lista completa
+                if accion != "Revisar" or aggregated:
+                    with st.spinner("Buscando cursos..."):
+                        course_ids = list(course_ids)
+                    for error in discovery_log.errors:
+                        st.error(error)
+            streaming = not isinstance(course_ids, list)
+            if not reuse_cache:
+                # Solo se vuelven a leer de Canvas los cursos de esta ejecución; los demás conservan su caché
+                if streaming:
+                    course_ids = refreshed(course_ids)
+                else:
+                    for course_id in course_ids:
+                        request_cache.invalidate(course_id)
+            store = open_snapshot_store() if incremental else None
+            st.session_state.pop("catalogue", None)
+            st.session_state.pop("correction_plans", None)
+            st.session_state.pop("review", None)
+            if not course_ids:
+                st.warning(no_courses)
+            elif accion == "Revisar" and aggregated:
+                progress = st.progress(0.0, text="Cargando cursos...")
+                frame, errors = report.load_catalogue(
+                    course_ids, int(max_workers),
+                    on_progress=lambda done, total: progress.progress(done / total, text=f"{done}/{total} cursos cargados"),
+                )
+                progress.empty()
+                # Se guarda para que los filtros (que vuelven a ejecutar el script) no repitan la descarga
+                st.session_state["catalogue"] = {"compliance": report.compliance_frame(frame), "errors": errors}
+            elif accion == "Revisar":
+                # Al presionar "Cancelar" Streamlit interrumpe esta ejecución; al cerrarse el generador
+                # no se inician más cursos y se cancelan las descargas en curso
+                cancel_event = threading.Event()
+                st.button("Cancelar revisión", on_click=cancel_event.set)
+                # Con IDs ingresados, un espacio por curso en ese orden que se llena cuando su revisión termina;
+                # con una búsqueda el total no se conoce, y cada curso se agrega al terminar
+                progress = st.empty() if streaming else st.progress(0.0, text="Revisando cursos...")
+                placeholders = {} if streaming else {course_id: st.empty() for course_id in dict.fromkeys(course_ids)}
+                for course_id, placeholder in placeholders.items():
+                    placeholder.caption(f"⏳ Curso {course_id}: en espera...")
+                review = st.session_state["review"] = {"course_ids": list(placeholders), "results": {}, "complete": False}
+                reused = 0
+                with closing(review_courses(course_ids, int(max_workers), store, cancel_event)) as results:
+                    for done, result in enumerate(results, start=1):
+                        course_id = result["course_id"]
+                        if course_id not in placeholders:
+                            placeholders[course_id] = st.empty()
+                            review["course_ids"].append(course_id)
+                        review["results"][course_id] = result
+                        with run_metrics.phase(course_id, "render"), placeholders[course_id].container():
+                            render_course_review(result)
+                        reused += result["reused"]
+                        if streaming:
+                            progress.caption(f"⏳ {done} cursos revisados; buscando más cursos...")
+                        else:
+                            progress.progress(done / len(course_ids), text=f"{done}/{len(course_ids)} cursos revisados")
+                review["complete"] = True
+                if streaming:
+                    progress.caption(f"{len(review['results'])} cursos encontrados y revisados.")
+                    for error in discovery_log.errors:
+                        st.error(error)
+                    if not review["results"] and not discovery_log.errors:
+                        st.warning(no_courses)
+                if store:
+                    st.caption(f"Revisión incremental: {reused} tareas sin cambios reutilizadas.")
+            else:  # acción "Corregir": primero solo se planifica; los cambios se aplican con otro botón
+                progress = st.progress(0.0, text="Planificando correcciones...")
+                plans = []
+                for done, plan in enumerate(plan_corrections(course_ids, int(max_workers)), start=1):
+                    plans.append(plan)
+                    progress.progress(done / len(course_ids), text=f"{done}/{len(course_ids)} cursos planificados")
+                progress.empty()
+                st.session_state["correction_plans"] = plans
+            if store:
+                store.close()
+            if course_ids:
+                render_run_stats(run_metrics)
+
+    # Una revisión ya mostrada en esta ejecución no se repite; en las siguientes (o si se canceló) se muestra lo guardado
+    if "review" in st.session_state and not executed:
+        render_review(st.session_state["review"])
+
+    if "catalogue" in st.session_state:
+        render_catalogue(st.session_state["catalogue"])
+
+    if "correction_plans" in st.session_state:
+        plans = st.session_state["correction_plans"]
+        render_correction_plans(plans)
+        pending = [plan for plan in plans if plan["steps"]]
+        if pending and st.button(f"Aplicar cambios en {len(pending)} cursos", type="primary"):
+            del st.session_state["correction_plans"]
+            run_metrics = Metrics()
+            progress = st.progress(0.0, text="Aplicando correcciones...")
+            done = 0
+
+            def show_progress(teams_done=0, teams_total=0):
+                text = f"{done}/{len(pending)} cursos corregidos"
+                if teams_total:
+                    text += f" · creando equipos ({teams_done}/{teams_total})"
+                progress.progress(done / len(pending), text=text)
+
+            with use_metrics(run_metrics):
+                for done, result in enumerate(apply_corrections(pending, int(max_workers), on_progress=show_progress),
+                                              start=1):
+                    with run_metrics.phase(result["course_id"], "render"):
+                        render_course_header(result["course_id"], result["course_info"])
+                        render_messages(result["messages"])
+                    show_progress()
+            render_run_stats(run_metrics)
 
 if __name__ == "__main__":
     main()
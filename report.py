@@ -0,0 +1,162 @@
+"""
+Reporte agregado de cumplimiento para muchos cursos a la vez.
+
+En lugar de una tabla por tarea, todas las tareas revisadas de todos los cursos se cargan en un
+único DataFrame y cada regla de rules.RULESETS se evalúa como una operación vectorizada sobre
+columnas. El resultado se resume por curso y se puede exportar a CSV o Parquet.
+"""
+import io
+import logging
+from concurrent.futures import as_completed
+
+import pandas as pd
+
+from rules import FAIL, OK, RULESETS, required_sources
+from revisor import (
+    MAX_WORKERS, REVIEW_SECTIONS, CollectingReporter, ContextThreadPoolExecutor, assignment_record, canvas_request,
+    get_metrics, load_course_snapshot, prefetch_course, use_course, use_reporter,
+)
+
+ID_COLUMNS = ["course_id", "course_name", "section", "kind", "assignment_id", "assignment"]
+
+
+def _course_rows(course_id):
+    """Registros de las tareas revisables de un curso (uno vacío por sección sin tareas) y sus errores."""
+    sources = required_sources(kind for _, _, kind in REVIEW_SECTIONS)
+    kind_sources = {kind: required_sources([kind]) for _, _, kind in REVIEW_SECTIONS}
+    rows = []
+    with use_reporter(CollectingReporter()) as collector, use_course(course_id):
+        try:
+            with get_metrics().phase(course_id, "fetch"):
+                prefetch_course(course_id, sources)
+                course_info = canvas_request("get", f"/courses/{course_id}") or {}
+                snapshot = load_course_snapshot(course_id, sources)
+            if snapshot is not None:
+                base = {"course_id": course_id, "course_name": course_info.get("name")}
+                for _, label, kind in REVIEW_SECTIONS:
+                    matching = snapshot.assignments_by_kind[kind]
+                    if not matching:
+                        rows.append({**base, "section": label, "kind": kind, "assignment_id": None, "assignment": None})
+                    for assignment in matching:
+                        with get_metrics().phase(course_id, "analyze"):
+                            record = assignment_record(snapshot, assignment, kind_sources[kind])
+                        rows.append({**base, "section": label, "kind": kind, "assignment_id": assignment["id"],
+                                     "assignment": assignment["name"], **record})
+        except Exception as e:
+            logging.exception(f"Error cargando el curso {course_id}")
+            collector.error(f"Error inesperado cargando el curso {course_id}: {e}")
+    return rows, collector.errors
+
+
+def load_catalogue(course_ids, max_workers=MAX_WORKERS, on_progress=None):
+    """
+    Descarga en paralelo los datos de todos los cursos y los retorna como un único DataFrame
+    con una fila por tarea, junto a la lista de errores. 'on_progress(hechos, total)' se invoca
+    en el hilo que llama.
+    """
+    rows, errors = [], []
+    with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_course_rows, course_id) for course_id in course_ids]
+        for done, future in enumerate(as_completed(futures), start=1):
+            course_rows, course_errors = future.result()
+            rows.extend(course_rows)
+            errors.extend(course_errors)
+            if on_progress:
+                on_progress(done, len(course_ids))
+    frame = pd.DataFrame(rows)
+    for column in ID_COLUMNS:
+        if column not in frame:
+            frame[column] = None
+    return frame, errors
+
+
+def normalize_names(names):
+    """
+    Versión vectorizada de revisor.clean_string. Se trabaja con dtype object para que las
+    expresiones regulares usen el motor de Python (\\w incluye letras acentuadas y la ñ).
+    """
+    return (names.fillna("").astype(str).astype(object).str.strip().str.lower()
+            .str.normalize("NFD")
+            .str.replace(r"[^\w\s.,!?-]", "", regex=True)
+            .str.replace("[\u0300-\u036f]", "", regex=True))
+
+
+def _vectorized_check(frame, rule):
+    """Evalúa una regla sobre todas las filas de 'frame' a la vez."""
+    column = frame[rule["field"]] if rule["field"] in frame else pd.Series(None, index=frame.index, dtype=object)
+    op, expected = rule["op"], rule.get("expected")
+    if op in ("eq", "ne"):
+        if isinstance(expected, tuple):
+            # Las listas (submission_types) se comparan como texto para evitar comparar objetos fila a fila
+            column, expected = column.map(lambda v: "|".join(v) if isinstance(v, tuple) else v), "|".join(expected)
+        result = column.eq(expected)
+        return result if op == "eq" else ~result
+    if op == "truthy":
+        return column.fillna(False).astype(bool)
+    if op == "falsy":
+        return ~column.fillna(False).astype(bool)
+    if op == "is_null":
+        return column.isna()
+    if op == "not_null":
+        return column.notna()
+    raise ValueError(f"Operación no soportada: {op}")
+
+
+def compliance_frame(frame):
+    """
+    Agrega al DataFrame una columna booleana por requerimiento (vacía si no aplica a la sección)
+    y la columna 'cumple', verdadera cuando la tarea existe y cumple todas sus reglas.
+    """
+    frame = frame.copy()
+    if "module_name" in frame:
+        frame["module_name_matches"] = frame["module_name"].notna() & normalize_names(frame["module_name"]).eq(
+            normalize_names(frame["assignment"]))
+    requirement_columns = []
+    for kind, rules in RULESETS.items():
+        rows = frame["kind"].eq(kind) & frame["assignment_id"].notna()
+        for rule in rules:
+            requirement = rule["requirement"]
+            if requirement not in frame:
+                frame[requirement] = pd.Series(pd.NA, index=frame.index, dtype="boolean")
+                requirement_columns.append(requirement)
+            if rows.any():
+                frame.loc[rows, requirement] = _vectorized_check(frame.loc[rows], rule).to_numpy()
+    checks = frame[requirement_columns]
+    frame["fallas"] = (checks == False).sum(axis=1)  # noqa: E712 (valores booleanos con NA)
+    frame["cumple"] = frame["assignment_id"].notna() & frame["fallas"].eq(0)
+    return frame[ID_COLUMNS + requirement_columns + ["fallas", "cumple"]]
+
+
+def course_summary(compliance):
+    """Conteo por curso de tareas que cumplen, que fallan y de secciones sin tareas."""
+    present = compliance["assignment_id"].notna()
+    summary = compliance.assign(
+        tareas=present,
+        cumplen=compliance["cumple"],
+        con_fallas=present & ~compliance["cumple"],
+        secciones_sin_tarea=~present,
+    ).groupby(["course_id", "course_name"], dropna=False)[["tareas", "cumplen", "con_fallas", "secciones_sin_tarea", "fallas"]].sum()
+    return summary.reset_index().sort_values(["con_fallas", "secciones_sin_tarea"], ascending=False)
+
+
+def as_status(compliance):
+    """Reemplaza los booleanos de los requerimientos por los íconos que usa la vista por tarea."""
+    requirement_columns = [c for c in compliance.columns if c not in ID_COLUMNS + ["fallas", "cumple"]]
+    status = compliance.copy()
+    for column in requirement_columns + ["cumple"]:
+        status[column] = compliance[column].map({True: OK, False: FAIL}).fillna("")
+    return status
+
+
+def to_csv_bytes(frame):
+    return frame.to_csv(index=False).encode("utf-8")
+
+
+def to_parquet_bytes(frame):
+    """Retorna el DataFrame en formato Parquet, o None si no está instalado pyarrow."""
+    buffer = io.BytesIO()
+    try:
+        frame.to_parquet(buffer, index=False)
+    except ImportError:
+        return None
+    return buffer.getvalue()
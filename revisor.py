@@ -0,0 +1,1401 @@
+"""
+Lógica de revisión y corrección de tareas de Canvas, independiente de la interfaz.
+
+Las funciones de este módulo no escriben directamente en pantalla: envían sus mensajes al
+Reporter activo del hilo (ver 'use_reporter'), que la interfaz de Streamlit (main.py) o la
+línea de comandos (cli.py) implementan a su manera.
+"""
+import requests
+from decouple import config
+import asyncio
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import unicodedata
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from functools import lru_cache
+import async_canvas
+from canvas_client import CanvasClient
+from instrumentation import Metrics, current_metrics
+from snapshot_store import SnapshotStore
+from rules import RULES_VERSION, TEAM_MAX_SIZE, TEAM_MIN_SIZE, evaluate, required_sources
+
+# Canvas API configuration (BASE_URL se puede apuntar a fake_canvas para pruebas y mediciones)
+BASE_URL = config("BASE_URL", default="https://canvas.uautonoma.cl/api/v1")
+CANVAS_URL = BASE_URL.rsplit("/api/v1", 1)[0]
+API_TOKEN = config("TOKEN")
+HEADERS = {
+    "Authorization": f"Bearer {API_TOKEN}",
+    "Content-Type": "application/json"   # Por defecto se usa JSON en otras llamadas
+}
+
+# Tamaño de página para los listados de Canvas (el máximo que acepta la API es 100)
+PER_PAGE = 100
+
+# Cuenta desde la que se buscan cursos por periodo o subcuenta (ver discover_courses)
+CANVAS_ACCOUNT_ID = config("CANVAS_ACCOUNT_ID", default="1")
+
+# Caché de peticiones GET (se conserva entre ejecuciones de la interfaz): vigencia en segundos
+# y número máximo de entradas
+CACHE_TTL = config("CACHE_TTL", default=300, cast=int)
+CACHE_MAX_ENTRIES = config("CACHE_MAX_ENTRIES", default=8192, cast=int)
+
+# Número de cursos que se revisan en paralelo (configurable desde .env o desde la interfaz)
+MAX_WORKERS = config("MAX_WORKERS", default=8, cast=int)
+
+# Revisión incremental: archivo SQLite con los resultados anteriores y su vigencia máxima en horas.
+# Los cambios en Canvas se detectan por la huella de cada tarea (ver assignment_fingerprint);
+# la vigencia acota cuánto se reutilizan un resultado y la información del curso sin volver a leerlos
+SNAPSHOT_DB = config("SNAPSHOT_DB", default="revisiones.sqlite3")
+SNAPSHOT_MAX_AGE_HOURS = config("SNAPSHOT_MAX_AGE_HOURS", default=168, cast=float)
+
+# Creación de equipos: escrituras simultáneas por curso y tope de peticiones por segundo de todo el proceso
+PROVISION_WORKERS = config("PROVISION_WORKERS", default=4, cast=int)
+PROVISION_RATE = config("PROVISION_RATE", default=10.0, cast=float)
+
+# Escrituras de una corrección (tarea y módulo, ver WriteQueue): simultáneas por curso y tope por segundo del proceso
+WRITE_WORKERS = config("WRITE_WORKERS", default=4, cast=int)
+WRITE_RATE = config("WRITE_RATE", default=10.0, cast=float)
+
+# Configuración de Turnitin (revisión de similitud) que se activa en el trabajo en equipo
+TURNITIN_SETTINGS = {
+    "similarityDetectionTool": "Lti::MessageHandler_123",
+    "configuration_tool_type": "Lti::MessageHandler",
+    "report_visibility": "immediate",
+}
+
+# Conexiones HTTP reutilizables: debe alcanzar para todos los hilos que hacen peticiones a la vez
+HTTP_POOL_SIZE = config("HTTP_POOL_SIZE", default=32, cast=int)
+HTTP_MAX_RETRIES = config("HTTP_MAX_RETRIES", default=5, cast=int)
+
+# Descarga asíncrona (httpx) de los datos de cada curso, con HTTP/2 opcional; si httpx no está
+# instalado o ASYNC_HTTP=False se usa solo la vía síncrona
+ASYNC_HTTP = config("ASYNC_HTTP", default=True, cast=bool)
+HTTP2 = config("HTTP2", default=False, cast=bool)
+
+# Métricas por defecto del proceso (latencia por endpoint, tiempo por curso y fase y totales de
+# peticiones); una interfaz con varias ejecuciones le da a cada una las suyas con use_metrics
+metrics = Metrics()
+
+def get_metrics():
+    """Metrics de la ejecución en curso, o las del proceso si no se indicó otro (ver use_metrics)."""
+    return current_metrics(metrics)
+
+# Cliente compartido (sesión de requests) con reintentos y frenado según los límites de Canvas
+client = CanvasClient(HEADERS, pool_size=HTTP_POOL_SIZE, max_retries=HTTP_MAX_RETRIES, metrics=metrics)
+
+class RequestCache:
+    """
+    Caché LRU con vigencia (TTL) para las respuestas GET de Canvas, indexada por método y endpoint.
+    Cada entrada queda asociada al curso que se estaba procesando al descargarla (ver use_course),
+    de modo que una escritura en un curso descarta solo las respuestas de ese curso y el resto
+    sobrevive entre ejecuciones. Los aciertos y fallos se registran por endpoint en las
+    métricas de la ejecución en curso (ver get_metrics). Es segura para usarse desde varios hilos.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Retorna (True, valor) si la clave está vigente en caché, o (False, None) si no.
+        La primera lectura de una respuesta adelantada (ver set) no es un acierto: cuenta como el
+        fallo que habría sido sin el adelanto, cuya petición ya quedó registrada al descargarla.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            found = entry is not None and time.monotonic() - entry[0] < self.ttl
+            if found:
+                self._entries.move_to_end(key)
+                if entry[3]:
+                    self._entries[key] = entry[:3] + (False,)
+            elif entry is not None:
+                del self._entries[key]
+        method, endpoint = key[0], key[1]
+        if found and not entry[3]:
+            get_metrics().record_cache_hit(method, endpoint)
+        else:
+            get_metrics().record_cache_miss(method, endpoint)
+        return (True, entry[1]) if found else (False, None)
+
+    def peek(self, key):
+        """Indica si la clave está vigente en caché, sin contarlo como acierto ni fallo."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry[0] < self.ttl
+
+    def set(self, key, value, course_id=None, prefetched=False):
+        """Guarda una respuesta; con prefetched=True se descargó antes de que alguien la pidiera."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value, course_id, prefetched)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, course_id=None):
+        """Descarta las respuestas del curso indicado, o todas si no se indica un curso."""
+        with self._lock:
+            if course_id is None:
+                self._entries.clear()
+                return
+            for key in [key for key, entry in self._entries.items() if entry[2] == str(course_id)]:
+                del self._entries[key]
+
+request_cache = RequestCache()
+
+class RateLimiter:
+    """Limita a 'rate' las peticiones por segundo entre todos los hilos que lo comparten."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# Compartidos por todos los cursos que se corrigen a la vez, para que el límite sea del proceso y no de cada curso
+provision_limiter = RateLimiter(PROVISION_RATE)
+write_limiter = RateLimiter(WRITE_RATE)
+
+class Reporter:
+    """
+    Destino de los mensajes que generan la revisión y la corrección.
+    La implementación base los envía al log; las interfaces la extienden para mostrarlos.
+    """
+
+    def info(self, message):
+        logging.info(message)
+
+    def success(self, message):
+        logging.info(message)
+
+    def warning(self, message):
+        logging.warning(message)
+
+    def error(self, message):
+        logging.error(message)
+
+    def progress(self, done, total, text):
+        """Avance de una operación larga; 'done' llega a 'total' cuando termina."""
+        pass
+
+    def details(self, label, lines):
+        """Lista de detalles asociada al último mensaje (por ejemplo, los errores de una operación)."""
+        for line in lines:
+            logging.info(f"{label}: {line}")
+
+class CollectingReporter(Reporter):
+    """
+    Acumula los mensajes en memoria; se usa en hilos de trabajo, que no pueden escribir en la interfaz.
+    Con log=False no los envía al log, para los mensajes que luego se reenvían a otro Reporter.
+    El último avance informado queda en 'last_progress' para que otro hilo lo muestre.
+    """
+
+    def __init__(self, log=True):
+        self.messages = []
+        self.log = log
+        self.last_progress = None
+
+    def _add(self, level, message):
+        self.messages.append({"level": level, "message": message})
+
+    def info(self, message):
+        if self.log:
+            super().info(message)
+        self._add("info", message)
+
+    def success(self, message):
+        if self.log:
+            super().success(message)
+        self._add("success", message)
+
+    def warning(self, message):
+        if self.log:
+            super().warning(message)
+        self._add("warning", message)
+
+    def error(self, message):
+        if self.log:
+            super().error(message)
+        self._add("error", message)
+
+    def progress(self, done, total, text):
+        self.last_progress = (done, total, text)
+
+    def details(self, label, lines):
+        if self.log:
+            super().details(label, lines)
+        self.messages.extend({"level": "detail", "message": f"{label}: {line}"} for line in lines)
+
+    @property
+    def errors(self):
+        return [m["message"] for m in self.messages if m["level"] == "error"]
+
+_default_reporter = Reporter()
+_thread_state = threading.local()
+
+def get_reporter():
+    """Retorna el Reporter activo en el hilo actual."""
+    return getattr(_thread_state, "reporter", None) or _default_reporter
+
+@contextmanager
+def use_reporter(reporter):
+    """Activa 'reporter' en el hilo actual mientras dure el bloque."""
+    previous = getattr(_thread_state, "reporter", None)
+    _thread_state.reporter = reporter
+    try:
+        yield reporter
+    finally:
+        _thread_state.reporter = previous
+
+def current_course():
+    """ID (como texto) del curso que se procesa en el hilo actual, o None."""
+    return getattr(_thread_state, "course_id", None)
+
+@contextmanager
+def use_course(course_id):
+    """
+    Marca el hilo actual como dedicado a 'course_id' mientras dure el bloque: las respuestas
+    que se guarden en caché quedan asociadas al curso y las escrituras solo descartan las suyas.
+    """
+    previous = current_course()
+    _thread_state.course_id = str(course_id) if course_id is not None else None
+    try:
+        yield
+    finally:
+        _thread_state.course_id = previous
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor cuyas tareas corren en una copia del contexto (contextvars) del hilo que
+    las envía, para que registren en las métricas de su ejecución (ver get_metrics).
+    """
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def report_error(message):
+    """Envía un error al Reporter activo."""
+    get_reporter().error(message)
+
+_NON_NAME_CHARS = re.compile(r'[^\w\s.,!?-]')
+_COMBINING_MARKS = re.compile(r'[\u0300-\u036f]')
+
+@lru_cache(maxsize=4096)
+def clean_string(input_string: str) -> str:
+    """Normaliza un nombre para compararlo: sin espacios extremos, en minúsculas y sin tildes ni símbolos."""
+    cleaned = input_string.strip().lower()
+    cleaned = unicodedata.normalize('NFD', cleaned)
+    cleaned = _NON_NAME_CHARS.sub('', cleaned)
+    cleaned = _COMBINING_MARKS.sub('', cleaned)
+    return cleaned
+
+def canvas_request(method, endpoint, payload=None):
+    """
+    Realiza peticiones a la API de Canvas de forma centralizada.
+    
+    :param method: Método HTTP ('get', 'post', 'put', 'delete')
+    :param endpoint: Endpoint de la API (por ejemplo, "/courses/123/assignments")
+    :param payload: Datos a enviar (para POST/PUT)
+    :return: La respuesta en formato JSON o None en caso de error
+    """
+    url = f"{BASE_URL}{endpoint}"
+    if method.lower() == "get":
+        cache_key = ("get", endpoint, None)
+        found, cached = request_cache.get(cache_key)
+        if found:
+            return cached
+    else:
+        request_cache.invalidate(current_course())
+    try:
+        if method.lower() == "get":
+            response = client.request("get", url)
+        elif method.lower() == "post":
+            response = client.request("post", url, json=payload)
+        elif method.lower() == "put":
+            response = client.request("put", url, json=payload)
+        elif method.lower() == "delete":
+            response = client.request("delete", url)
+        else:
+            report_error("Método HTTP no soportado")
+            return None
+
+        if not response.ok:
+            report_error(f"Error en la petición a {url} ({response.status_code}): {response.text}")
+            return None
+
+        data = response.json() if response.text else None
+        if method.lower() == "get":
+            request_cache.set(cache_key, data, current_course())
+        return data
+
+    except requests.exceptions.RequestException as e:
+        report_error(f"Excepción en la petición a {url}: {e}")
+        return None
+
+def _get_page(url, params=None):
+    """
+    Obtiene una página de un listado de Canvas.
+    Retorna (items, url de la página siguiente, mensaje de error). No escribe en la página
+    para que pueda ejecutarse desde el hilo que precarga la página siguiente.
+    """
+    try:
+        response = client.request("get", url, params=params)
+    except requests.exceptions.RequestException as e:
+        return None, None, f"Excepción en la petición a {url}: {e}"
+    if not response.ok:
+        return None, None, f"Error en la petición a {url} ({response.status_code}): {response.text}"
+    next_url = response.links.get("next", {}).get("url")
+    return (response.json() if response.text else []), next_url, None
+
+def _iter_pages(endpoint, params=None, per_page=PER_PAGE, prefetch=True):
+    """
+    Recorre las páginas de un listado siguiendo el header Link (rel="next").
+    Con prefetch=True la página siguiente se descarga mientras se procesa la actual.
+    Entrega tuplas (items, error); después de un error no se entregan más páginas.
+    """
+    params = {**(params or {}), "per_page": per_page}
+    url = f"{BASE_URL}{endpoint}"
+    if not prefetch:
+        while url:
+            items, url, error = _get_page(url, params)
+            params = None  # la URL de la página siguiente ya incluye los parámetros
+            yield items, error
+            if error:
+                return
+        return
+
+    with ContextThreadPoolExecutor(max_workers=1) as executor:
+        pending = executor.submit(_get_page, url, params)
+        while pending:
+            items, next_url, error = pending.result()
+            pending = executor.submit(_get_page, next_url) if next_url and not error else None
+            yield items, error
+            if error:
+                return
+
+def canvas_paginate(endpoint, params=None, per_page=PER_PAGE, prefetch=True):
+    """Generador que entrega uno a uno los elementos de un listado paginado de Canvas."""
+    for items, error in _iter_pages(endpoint, params, per_page, prefetch):
+        if error:
+            report_error(error)
+            return
+        yield from items
+
+def _list_cache_key(endpoint, params):
+    return ("get", endpoint, tuple(sorted((key, tuple(value) if isinstance(value, list) else value)
+                                          for key, value in (params or {}).items())))
+
+def canvas_get_all(endpoint, params=None, per_page=PER_PAGE):
+    """Obtiene todas las páginas de un listado. Retorna la lista completa o None en caso de error."""
+    cache_key = _list_cache_key(endpoint, params)
+    found, cached = request_cache.get(cache_key)
+    if found:
+        return cached
+    results = []
+    for items, error in _iter_pages(endpoint, params, per_page):
+        if error:
+            report_error(error)
+            return None
+        results.extend(items)
+    request_cache.set(cache_key, results, current_course())
+    return results
+
+def parse_course_ids(input_text):
+    """Limpia y procesa el input para extraer los course IDs."""
+    cleaned = input_text.replace(",", "\n").replace(" ", "\n")
+    return list(filter(None, map(lambda x: x.strip(), cleaned.split("\n"))))
+
+def discover_courses(account_id, term_id=None, subaccount_ids=None, search_term=None, name_pattern=None):
+    """
+    Genera los IDs de los cursos de una cuenta (/accounts/{id}/courses) a medida que llegan las
+    páginas, filtrados en Canvas por periodo (enrollment_term_id), subcuentas (by_subaccounts[])
+    y texto en el nombre o código (search_term, mínimo 2 caracteres), y localmente por la
+    expresión regular 'name_pattern' sobre el nombre o el código del curso.
+    Cada curso encontrado queda en la caché como si se hubiera pedido /courses/{id}.
+    """
+    params = {}
+    if term_id:
+        params["enrollment_term_id"] = term_id
+    if subaccount_ids:
+        params["by_subaccounts[]"] = list(subaccount_ids)
+    if search_term:
+        params["search_term"] = search_term
+    pattern = re.compile(name_pattern, re.IGNORECASE) if name_pattern else None
+    for course in canvas_paginate(f"/accounts/{account_id}/courses", params):
+        if pattern and not (pattern.search(course.get("name") or "") or pattern.search(course.get("course_code") or "")):
+            continue
+        course_id = str(course["id"])
+        request_cache.set(("get", f"/courses/{course_id}", None), course, course_id)
+        yield course_id
+
+def summarize_group_categories(group_categories):
+    """Verifica si existen las categorías de grupo 'Equipo de trabajo' y 'Project Groups'."""
+    trabajo_en_equipo = next((gc for gc in group_categories if gc.get("name") == "Equipo de trabajo"), None)
+    project_groups = next((gc for gc in group_categories if gc.get("name") == "Project Groups"), None)
+
+    return {
+        "Equipo de trabajo": {
+            "exists": trabajo_en_equipo is not None,
+            "id": trabajo_en_equipo["id"] if trabajo_en_equipo else None,
+        },
+        "Project Groups": {
+            "exists": project_groups is not None,
+            "id": project_groups["id"] if project_groups else None,
+        }
+    }
+
+# Patrón del nombre de la tarea, título de la sección y conjunto de reglas (ver rules.RULESETS)
+REVIEW_SECTIONS = (
+    ("foro academico", "Foro academico", "forum"),
+    ("trabajo en equipo", "Trabajo en equipo", "teamwork"),
+    ("trabajo final", "Trabajo final", "finalwork"),
+)
+
+class CourseSnapshot:
+    """
+    Foto de un curso cargada con pocas llamadas masivas: los módulos (assignment groups) junto
+    con sus tareas y las categorías de grupo. Los analizadores trabajan sobre estos índices en
+    memoria en lugar de consultar la API por cada tarea. Al cargarla, cada tarea se clasifica
+    en las secciones de REVIEW_SECTIONS según su nombre normalizado, en una sola pasada.
+    """
+
+    def __init__(self, course_id, assignment_groups, group_categories):
+        self.course_id = course_id
+        self.assignment_groups = assignment_groups
+        self.group_categories = group_categories
+        self.assignments = [a for group in assignment_groups for a in group.get("assignments") or []]
+        self.assignments_by_id = {a["id"]: a for a in self.assignments}
+        self.groups_by_id = {group["id"]: group for group in assignment_groups}
+        self.group_categories_check = summarize_group_categories(group_categories)
+        self._team_status = None
+        self._team_status_loaded = False
+        # Una tarea puede pertenecer a más de una sección si su nombre contiene varios patrones
+        self.assignments_by_kind = {kind: [] for _, _, kind in REVIEW_SECTIONS}
+        for assignment in self.assignments:
+            name = clean_string(assignment.get("name") or "")
+            for pattern, _, kind in REVIEW_SECTIONS:
+                if pattern in name:
+                    self.assignments_by_kind[kind].append(assignment)
+
+    def module_info(self, assignment_group_id):
+        """Retorna el nombre, peso e id del módulo (assignment group), o None si no existe."""
+        group = self.groups_by_id.get(assignment_group_id)
+        if group is None:
+            return None
+        return {
+            "name": group.get("name"),
+            "weight": group.get("group_weight"),
+            "id": group.get("id")
+        }
+
+    def team_data(self):
+        """
+        Equipos de 'Equipo de trabajo' (con sus miembros) y estudiantes del curso, tal como los
+        informa Canvas, para la huella de la revisión incremental. None si alguna consulta falla.
+        Usa las mismas consultas (y la misma caché) que check_team_assignments.
+        """
+        category_id = self.group_categories_check["Equipo de trabajo"]["id"]
+        if category_id is None:
+            return {}
+        groups = canvas_get_all(f"/group_categories/{category_id}/groups", {"include[]": ["users"]})
+        if groups is None:
+            return None
+        if not groups:
+            # Como en check_team_assignments, sin equipos los estudiantes no cambian el resultado
+            return {"groups": []}
+        students = canvas_get_all(f"/courses/{self.course_id}/students")
+        if students is None:
+            return None
+        return {
+            "groups": sorted((group.get("id"), sorted(user["id"] for user in group.get("users") or []))
+                             for group in groups),
+            "students": sorted(student["id"] for student in students),
+        }
+
+    def team_status(self):
+        """Estado de los equipos de 'Equipo de trabajo'; se calcula una sola vez por curso."""
+        if not self._team_status_loaded:
+            self._team_status = check_team_assignments(self.course_id, self.group_categories)
+            self._team_status_loaded = True
+        return self._team_status
+
+def load_course_snapshot(course_id, sources=None):
+    """
+    Carga la foto de un curso. Retorna None si alguna de las llamadas falla.
+    'sources' (ver rules.required_sources) permite omitir las categorías de grupo cuando
+    ninguna regla las necesita; por defecto se carga todo.
+    """
+    assignment_groups = canvas_get_all(f"/courses/{course_id}/assignment_groups",
+                                       {"include[]": ["assignments", "discussion_topic"]})
+    if assignment_groups is None:
+        return None
+    group_categories = []
+    if sources is None or {"categories", "teams"} & set(sources):
+        group_categories = canvas_get_all(f"/courses/{course_id}/group_categories")
+        if group_categories is None:
+            return None
+    return CourseSnapshot(course_id, assignment_groups, group_categories)
+
+_async_client = None
+_async_client_lock = threading.Lock()
+
+def get_async_client():
+    """Cliente asíncrono compartido (se crea al primer uso), o None si está desactivado o falta httpx."""
+    global _async_client
+    if not ASYNC_HTTP or not async_canvas.is_available():
+        return None
+    with _async_client_lock:
+        if _async_client is None:
+            _async_client = async_canvas.AsyncCanvasClient(client, HTTP_POOL_SIZE, HTTP2)
+            atexit.register(_async_client.close)
+        return _async_client
+
+async def _prefetch_course(async_client, course_id, sources, scope):
+    """
+    Descarga a la vez las consultas independientes de un curso y las deja en la caché con las
+    mismas claves que usan canvas_request y canvas_get_all. Las que fallan no se guardan.
+    """
+    async def get_list(endpoint, params=None):
+        data = await async_client.get_all(f"{BASE_URL}{endpoint}", {**(params or {}), "per_page": PER_PAGE})
+        if data is not None:
+            request_cache.set(_list_cache_key(endpoint, params), data, scope, prefetched=True)
+        return data
+
+    async def get_one(endpoint):
+        data = await async_client.get(f"{BASE_URL}{endpoint}")
+        if data is not None:
+            request_cache.set(("get", endpoint, None), data, scope, prefetched=True)
+        return data
+
+    wants_categories = sources is None or {"categories", "teams"} & set(sources)
+    wants_teams = sources is None or "teams" in sources
+    lookups = [get_one(f"/courses/{course_id}"),
+               get_list(f"/courses/{course_id}/assignment_groups", {"include[]": ["assignments", "discussion_topic"]})]
+    if wants_categories:
+        lookups.append(get_list(f"/courses/{course_id}/group_categories"))
+    results = await asyncio.gather(*lookups)
+    group_categories = results[2] if wants_categories else None
+    if not (wants_teams and group_categories):
+        return
+    equipo_de_trabajo = next((gc for gc in group_categories if gc.get("name") == "Equipo de trabajo"), None)
+    if equipo_de_trabajo:
+        await asyncio.gather(get_list(f"/group_categories/{equipo_de_trabajo['id']}/groups", {"include[]": ["users"]}),
+                             get_list(f"/courses/{course_id}/students"))
+
+def prefetch_course(course_id, sources=None, cancel_event=None):
+    """
+    Si la vía asíncrona está disponible, adelanta en paralelo las descargas de un curso que
+    luego leen load_course_snapshot y check_team_assignments ('sources' como en load_course_snapshot).
+    Cualquier falla se ignora: la vía síncrona vuelve a intentar lo que no quedó en caché.
+    Si se activa 'cancel_event' las descargas en curso se cancelan y se lanza CancelledError.
+    """
+    async_client = get_async_client()
+    if async_client is None:
+        return
+    uncached = [key for key in (("get", f"/courses/{course_id}", None),
+                                _list_cache_key(f"/courses/{course_id}/assignment_groups",
+                                                {"include[]": ["assignments", "discussion_topic"]}))
+                if not request_cache.peek(key)]
+    if not uncached:
+        return
+    try:
+        async_client.run(_prefetch_course(async_client, course_id, sources, current_course()), cancel_event=cancel_event)
+    except CancelledError:
+        raise
+    except Exception as e:
+        logging.warning(f"Descarga asíncrona del curso {course_id} fallida, se usa la vía síncrona: {e}")
+
+def get_rubric_details(course_id, assignment):
+    """Obtiene detalles de la rúbrica asociada a una tarea."""
+    if assignment.get("rubric_settings"):
+        rubric_used_for_grading = assignment.get("use_rubric_for_grading")
+        rubric_settings = assignment["rubric_settings"]
+        return {
+            "has_rubric": True,
+            "rubric_points": rubric_settings.get("points_possible"),
+            "rubric_used_for_grading": rubric_used_for_grading,
+            "name": rubric_settings.get("title")
+        }
+    return {"has_rubric": False, "rubric_points": None, "rubric_used_for_grading": False}
+
+def team_sizes(n_students, min_size, max_size):
+    """
+    Tamaños de los equipos para 'n_students' estudiantes: la menor cantidad de equipos que
+    respeta 'max_size', con tamaños que difieren a lo más en uno. Si es posible formar equipos
+    dentro de [min_size, max_size], todos quedan en ese rango; si no (por ejemplo, 5 estudiantes
+    en equipos de 3 a 4), se prioriza 'max_size' y los equipos quedan lo más parejos posible.
+    """
+    if n_students <= 0:
+        return []
+    count = -(-n_students // max_size)
+    base, extra = divmod(n_students, count)
+    return [base + 1] * extra + [base] * (count - extra)
+
+def distribuir_estudiantes(student_ids, min_size, max_size, key=None):
+    """
+    Distribuye los estudiantes en equipos cumpliendo con el tamaño mínimo y máximo (ver 'team_sizes').
+    Se retorna una lista de listas, donde cada sublista representa un equipo.
+    Sin 'key' los equipos se forman con estudiantes consecutivos. Con 'key' (una función que
+    recibe el ID del estudiante y retorna, por ejemplo, su sección o su equipo anterior) los
+    estudiantes con la misma clave se reparten entre equipos distintos en lo posible.
+    """
+    sizes = team_sizes(len(student_ids), min_size, max_size)
+    if key is None:
+        teams, start = [], 0
+        for size in sizes:
+            teams.append(list(student_ids[start:start + size]))
+            start += size
+        return teams
+
+    # Agrupar por clave (en orden de aparición) y repartir en ronda: el i-ésimo estudiante va al
+    # equipo i % k, lo que produce exactamente los tamaños de 'team_sizes' y separa a los de una misma clave
+    groups = {}
+    for student_id in student_ids:
+        groups.setdefault(key(student_id), []).append(student_id)
+    teams = [[] for _ in sizes]
+    position = 0
+    for members in groups.values():
+        for student_id in members:
+            teams[position % len(teams)].append(student_id)
+            position += 1
+    return teams
+
+def _limited_request(limiter, course_id, method, endpoint, payload=None):
+    """Ejecuta una escritura respetando el limitador. Retorna (respuesta, errores) para usarse en un hilo de trabajo."""
+    with use_reporter(CollectingReporter()) as collector, use_course(course_id):
+        limiter.wait()
+        return canvas_request(method, endpoint, payload), collector.errors
+
+def _limited_call(limiter, course_id, func, *args):
+    """Como _limited_request, para una función de escritura. Retorna (resultado, mensajes para reenviar)."""
+    with use_reporter(CollectingReporter(log=False)) as collector, use_course(course_id):
+        limiter.wait()
+        return func(*args), collector.messages
+
+def _run_writes(executor, limiter, requests_by_key, on_done):
+    """Ejecuta en paralelo las escrituras {clave: (método, endpoint, payload)} y retorna {clave: (respuesta, errores)}."""
+    course_id = current_course()
+    futures = {executor.submit(_limited_request, limiter, course_id, *request): key
+               for key, request in requests_by_key.items()}
+    results = {}
+    for future in as_completed(futures):
+        results[futures[future]] = future.result()
+        on_done()
+    return results
+
+def provision_teams(group_category_id, teams, bulk_members=True, max_workers=PROVISION_WORKERS,
+                    limiter=provision_limiter, on_progress=None):
+    """
+    Crea los equipos en Canvas en paralelo y luego les asigna sus estudiantes.
+    Con bulk_members=True cada equipo recibe a todos sus miembros en un único PUT /groups/{id};
+    si no, se hace un POST de membresía por estudiante, también en paralelo.
+    'on_progress(hechos, total)' se invoca en el hilo que llama, por lo que puede actualizar la página.
+    Las peticiones pasan por 'limiter', compartido por defecto con los demás cursos en curso.
+    Retorna un resumen con los equipos creados, los estudiantes asignados y los errores.
+    """
+    total = len(teams) + (len(teams) if bulk_members else sum(len(team) for team in teams))
+    done = 0
+    failures = []
+
+    def advance():
+        nonlocal done
+        done += 1
+        if on_progress:
+            on_progress(done, total)
+
+    with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+        creations = _run_writes(executor, limiter, {
+            idx: ("post", f"/group_categories/{group_category_id}/groups", {"name": f"Equipo de trabajo {idx + 1}"})
+            for idx in range(len(teams))
+        }, advance)
+
+        group_ids = {}
+        for idx, (response, errors) in sorted(creations.items()):
+            if response is None:
+                failures.append(f"No se pudo crear el equipo 'Equipo de trabajo {idx + 1}'.")
+                failures.extend(errors)
+                # Sus miembros ya no se podrán asignar; se descuentan del total
+                total -= 1 if bulk_members else len(teams[idx])
+            else:
+                group_ids[idx] = response.get("id")
+
+        if bulk_members:
+            memberships = {
+                (idx, None): ("put", f"/groups/{group_id}", {"members": teams[idx]})
+                for idx, group_id in group_ids.items()
+            }
+        else:
+            memberships = {
+                (idx, student_id): ("post", f"/groups/{group_id}/memberships", {"user_id": student_id})
+                for idx, group_id in group_ids.items() for student_id in teams[idx]
+            }
+        assigned = 0
+        for (idx, student_id), (response, errors) in _run_writes(executor, limiter, memberships, advance).items():
+            if response is None:
+                target = f"al estudiante {student_id}" if student_id is not None else "a los estudiantes"
+                failures.append(f"Error al asignar {target} al equipo 'Equipo de trabajo {idx + 1}'.")
+                failures.extend(errors)
+            else:
+                assigned += len(teams[idx]) if student_id is None else 1
+
+    return {"teams_created": len(group_ids), "students_assigned": assigned, "failures": failures}
+
+def assign_students_to_teams(course_id, group_category_id, min_size=3, max_size=4, bulk_members=True, key=None):
+    """
+    Crea equipos en Canvas y asigna a cada estudiante a un equipo.
+    Se utiliza la función 'distribuir_estudiantes' para dividir los IDs de los estudiantes
+    (equilibrando por 'key' si se entrega) y 'provision_teams' para crearlos, mostrando una
+    sola barra de progreso y un resumen final.
+    """
+    students_response = canvas_get_all(f"/courses/{course_id}/students")
+    if students_response is None:
+        return
+
+    student_ids = [student["id"] for student in students_response]
+    
+    teams = distribuir_estudiantes(student_ids, min_size, max_size, key)
+
+    reporter = get_reporter()
+    summary = provision_teams(
+        group_category_id, teams, bulk_members,
+        on_progress=lambda done, total: reporter.progress(done, total, f"Creando equipos ({done}/{total})"),
+    )
+
+    if summary["failures"]:
+        reporter.warning(f"{summary['teams_created']} equipos creados y {summary['students_assigned']} de {len(student_ids)} estudiantes asignados, con {len(summary['failures'])} errores.")
+        reporter.details("Ver errores", summary["failures"])
+    else:
+        reporter.success(f"{summary['teams_created']} equipos creados y todos los estudiantes ({summary['students_assigned']}) asignados exitosamente.")
+
+def check_team_assignments(course_id, group_categories=None):
+    """
+    Verifica si se han creado equipos y si todos los estudiantes están asignados a un equipo
+    en la categoría 'Equipo de trabajo'. En la misma pasada detecta estudiantes en más de un
+    equipo y equipos fuera del rango [TEAM_MIN_SIZE, TEAM_MAX_SIZE]. Si ya se tienen las
+    categorías de grupo del curso se pueden entregar en 'group_categories' para no volver a pedirlas.
+    """
+    if group_categories is None:
+        group_categories = canvas_get_all(f"/courses/{course_id}/group_categories")
+    if not group_categories:
+        return None
+
+    equipo_de_trabajo = next((gc for gc in group_categories if gc.get("name") == "Equipo de trabajo"), None)
+    if not equipo_de_trabajo:
+        return {"teams_created": False, "all_assigned": False}
+    
+    # Una sola consulta (paginada) trae todos los equipos de la categoría con sus miembros
+    group_category_id = equipo_de_trabajo["id"]
+    groups = canvas_get_all(f"/group_categories/{group_category_id}/groups", {"include[]": ["users"]})
+    if not groups:
+        return {"teams_created": False, "all_assigned": False}
+
+    students_response = canvas_get_all(f"/courses/{course_id}/students")
+    if not students_response:
+        return None
+    
+    student_ids = {student["id"] for student in students_response}
+    assigned_student_ids = set()
+    duplicated_student_ids = set()
+    undersized_teams = []
+    oversized_teams = []
+
+    for group in groups:
+        members = {user["id"] for user in group.get("users") or []} & student_ids
+        duplicated_student_ids |= assigned_student_ids & members
+        assigned_student_ids |= members
+        if len(members) < TEAM_MIN_SIZE:
+            undersized_teams.append(group.get("name"))
+        elif len(members) > TEAM_MAX_SIZE:
+            oversized_teams.append(group.get("name"))
+
+    all_assigned = student_ids.issubset(assigned_student_ids)
+    return {
+        "teams_created": True,
+        "all_assigned": all_assigned,
+        "unassigned_students": student_ids - assigned_student_ids,
+        "total_students": student_ids,
+        "duplicated_students": duplicated_student_ids,
+        "undersized_teams": undersized_teams,
+        "oversized_teams": oversized_teams,
+    }
+
+def assignment_record(snapshot, assignment, sources):
+    """
+    Registro plano con los campos de una tarea que leen las reglas (ver rules.FIELD_SOURCES).
+    Solo se calculan los orígenes de datos indicados en 'sources'; en particular, el estado
+    de los equipos (lo más costoso de obtener) solo se consulta si alguna regla lo necesita.
+    """
+    record = {}
+    if "assignment" in sources:
+        rubric_details = get_rubric_details(snapshot.course_id, assignment)
+        record.update({
+            "rubric_has": rubric_details["has_rubric"],
+            "rubric_name": rubric_details.get("name"),
+            "rubric_points": rubric_details["rubric_points"],
+            "rubric_used_for_grading": rubric_details["rubric_used_for_grading"],
+            "submission_types": tuple(assignment.get("submission_types") or ()),
+            "allowed_attempts": assignment.get("allowed_attempts"),
+            "grading_type": assignment.get("grading_type"),
+            "points_possible": assignment.get("points_possible"),
+            "group_category_id": assignment.get("group_category_id"),
+            "discussion_type": (assignment.get("discussion_topic") or {}).get("discussion_type"),
+        })
+    if "module" in sources:
+        module_info = snapshot.module_info(assignment.get("assignment_group_id")) or {}
+        record.update({
+            "module_name": module_info.get("name"),
+            "module_weight": module_info.get("weight"),
+            "module_name_matches": module_info.get("name") is not None
+                and clean_string(module_info["name"]) == clean_string(assignment.get("name") or ""),
+        })
+    if "categories" in sources:
+        record.update({
+            "equipo_de_trabajo_exists": snapshot.group_categories_check["Equipo de trabajo"]["exists"],
+            "project_groups_exists": snapshot.group_categories_check["Project Groups"]["exists"],
+        })
+    if "teams" in sources:
+        team_options = snapshot.team_status() or {}
+        unassigned = team_options.get("unassigned_students")
+        duplicated = team_options.get("duplicated_students") or set()
+        badly_sized = (team_options.get("undersized_teams") or []) + (team_options.get("oversized_teams") or [])
+        record.update({
+            "teams_created": bool(team_options.get("teams_created")),
+            "teams_all_assigned": bool(team_options.get("all_assigned")),
+            "teams_unassigned_text": f"{len(unassigned)} sin asignar" if unassigned is not None else "sin equipos",
+            "teams_duplicated_count": len(duplicated),
+            "teams_badly_sized_count": len(badly_sized),
+            "teams_badly_sized_text": ", ".join(str(name) for name in badly_sized),
+        })
+    return record
+
+def analyze_assignments(snapshot, kind, assignments):
+    """
+    Aplica las reglas de 'kind' ("forum", "teamwork" o "finalwork") a un lote de tareas del curso.
+    Retorna, para cada tarea, (detalles, columna de estado).
+    """
+    sources = required_sources([kind])
+    return evaluate(kind, [assignment_record(snapshot, assignment, sources) for assignment in assignments])
+
+def flatten_assignment_payload(nested_payload):
+    """
+    Transforma un payload anidado en uno plano con claves que sigan el formato que espera Canvas.
+    Por ejemplo, transforma:
+       {"assignment": {"grading_type": "points", "submission_types": ["online_upload"], ...}}
+    en:
+       {"assignment[grading_type]": "points",
+        "assignment[submission_types][]": "online_upload",
+        "assignment[submission_type]": "online",
+        ... }
+    """
+    assignment_data = nested_payload.get("assignment", {})
+    flat = {}
+    # Se asume que submission_types es una lista; se envía el primer valor
+    if "submission_types" in assignment_data:
+        flat["assignment[submission_types][]"] = assignment_data["submission_types"][0] if assignment_data["submission_types"] else ""
+    # Se agrega un valor fijo para submission_type
+    flat["assignment[submission_type]"] = "online"
+    # Para el resto de claves
+    for key, value in assignment_data.items():
+        if key == "submission_types":
+            continue  # ya se procesó
+        flat[f"assignment[{key}]"] = value
+    # Si no se especifica, se puede incluir group_assignment como true
+    if "group_assignment" not in assignment_data:
+        flat["assignment[group_assignment]"] = True
+    return flat
+
+def update_assignment(course_id, assignment_id, payload):
+    """Actualiza la configuración de una tarea utilizando payload en formato form-encoded."""
+    endpoint = f"/courses/{course_id}/assignments/{assignment_id}"
+    url = f"{BASE_URL}{endpoint}"
+    flat_payload = flatten_assignment_payload(payload)
+    headers_form = HEADERS.copy()
+    headers_form["Content-Type"] = "application/x-www-form-urlencoded"
+    request_cache.invalidate(current_course())
+    try:
+        response = client.request("put", url, data=flat_payload, headers=headers_form)
+        if response.ok:
+            get_reporter().success("Opciones del trabajo en grupo corregidos!")
+            return response.json()
+        else:
+            report_error(f"Error al actualizar la tarea: {response.text}")
+            return None
+    except requests.exceptions.RequestException as e:
+        report_error(f"Excepción al actualizar la tarea: {e}")
+        return None
+
+def update_group(course_id: str, assignment_group_id: str, payload):
+    """Actualiza la configuración de un grupo (módulo)."""
+    response = canvas_request("put", f"/courses/{course_id}/assignment_groups/{assignment_group_id}", payload)
+    if response:
+        get_reporter().success("Opciones del grupo corregidas!")
+        return True
+    else:
+        return False
+
+# Valor de group_category_id que se reemplaza por la categoría 'Equipo de trabajo' creada en el mismo plan
+CREATED_CATEGORY = "(Equipo de trabajo)"
+
+# Motivo que registra WriteQueue para los campos agregados a una escritura ya encolada
+MERGED = "combinado en la misma petición"
+
+class WriteQueue:
+    """
+    Escrituras pendientes de un plan de corrección, agrupadas por recurso.
+    'update' compara los campos deseados con los descargados de Canvas y solo encola los que
+    cambian; las llamadas sobre un recurso que ya tiene una escritura pendiente se combinan en
+    ella, de modo que cada recurso recibe a lo más una petición. Un campo que Canvas no informa
+    se considera distinto y se envía. Cada campo omitido, cada combinación y cada petición que
+    no hace falta quedan en 'log' para informarlos.
+    """
+
+    def __init__(self):
+        self._steps = {}
+        self._resources = {}
+        self.log = []
+
+    def update(self, resource, step, current, desired):
+        """
+        Encola los campos de 'desired' que difieren de 'current' en la escritura 'step' (un paso
+        de apply_correction_plan sin su payload, p. ej. {"action": "update_group", ...}).
+        Retorna los campos encolados.
+        """
+        key = tuple(sorted(step.items()))
+        self._resources.setdefault(key, resource)
+        changed = {}
+        for field, value in desired.items():
+            if field in current and current[field] == value:
+                self.log.append({"recurso": resource, "campo": field, "motivo": f"sin cambios ({value})"})
+            else:
+                changed[field] = value
+        if not changed:
+            return changed
+        if key in self._steps:
+            self._steps[key]["payload"].update(changed)
+            self.log.extend({"recurso": resource, "campo": field, "motivo": MERGED} for field in changed)
+        else:
+            self._steps[key] = {**step, "payload": changed}
+        return changed
+
+    def steps(self):
+        """Pasos de escritura para el plan, uno por recurso con cambios; registra los recursos sin cambios."""
+        for key, resource in self._resources.items():
+            if key not in self._steps:
+                self.log.append({"recurso": resource, "campo": "-", "motivo": "petición omitida: no hay cambios"})
+        return list(self._steps.values())
+
+def flush_writes(course_id, steps, created_category_id=None, max_workers=WRITE_WORKERS, limiter=write_limiter):
+    """
+    Envía a la vez (a lo más 'max_workers' en paralelo y al ritmo de 'limiter', compartido por defecto
+    con los demás cursos en curso) los pasos 'update_assignment' y 'update_group' de un plan, e informa
+    al Reporter activo sus mensajes en el orden del plan. CREATED_CATEGORY se reemplaza por 'created_category_id', o se quita si
+    la categoría no se pudo crear. Retorna el resultado de cada paso (None si falló o no se envió).
+    """
+    calls = []
+    for index, step in enumerate(steps):
+        payload = dict(step["payload"])
+        if step["action"] == "update_assignment":
+            if payload.get("group_category_id") == CREATED_CATEGORY:
+                if created_category_id:
+                    payload["group_category_id"] = created_category_id
+                else:
+                    del payload["group_category_id"]
+            if payload:
+                calls.append((index, update_assignment, course_id, step["assignment_id"], {"assignment": payload}))
+        elif step["action"] == "update_group":
+            calls.append((index, update_group, course_id, step["assignment_group_id"], payload))
+    results = [None] * len(steps)
+    if not calls:
+        return results
+
+    reporter = get_reporter()
+    with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(index, executor.submit(_limited_call, limiter, course_id, *call)) for index, *call in calls]
+        for index, future in futures:
+            results[index], messages = future.result()
+            for message in messages:
+                getattr(reporter, message["level"])(message["message"])
+    return results
+
+def plan_teamwork_correction(course_id, store=None):
+    """
+    Calcula, sin escribir en Canvas, las correcciones que necesita la tarea 'Trabajo en equipo'
+    de un curso. Retorna un plan con:
+      - notes: avisos que requieren intervención manual, como (nivel, mensaje),
+      - changes: diferencias entre lo actual y lo deseado, para mostrarlas antes de aplicar,
+      - steps: escrituras a realizar, en orden (ver apply_correction_plan),
+      - coalesced: escrituras de la tarea y del módulo omitidas o combinadas (ver WriteQueue).
+    Canvas no informa la configuración de Turnitin al leer la tarea; con un SnapshotStore se
+    compara con la última que se aplicó a esta misma versión de la tarea (ver apply_correction_plan).
+    """
+    plan = {"course_id": course_id, "course_info": canvas_request("get", f"/courses/{course_id}"),
+            "assignment_id": None, "assignment_name": None, "notes": [], "changes": [], "steps": [], "coalesced": []}
+    snapshot = load_course_snapshot(course_id)
+    if snapshot is None:
+        plan["notes"].append(("error", f"No se pudieron obtener los datos del curso {course_id}."))
+        return plan
+    teamwork_assignments = snapshot.assignments_by_kind["teamwork"]
+    if not teamwork_assignments:
+        plan["notes"].append(("info", f"No hay tareas 'Trabajo en equipo' en el curso {course_id}."))
+        return plan
+
+    # Se utiliza la primera tarea encontrada para corrección.
+    teamwork_assignment = teamwork_assignments[0]
+    plan["assignment_id"] = teamwork_assignment.get("id")
+    plan["assignment_name"] = teamwork_assignment.get("name")
+    correct_module = snapshot.module_info(teamwork_assignment.get("assignment_group_id"))
+    correct_group_categories = snapshot.group_categories_check
+    correct_teams = snapshot.team_status()
+
+    def change(resource, field, current, desired):
+        plan["changes"].append({"recurso": resource, "campo": field, "actual": str(current), "deseado": str(desired)})
+
+    writes = WriteQueue()
+    assignment_step = {"action": "update_assignment", "assignment_id": teamwork_assignment.get("id")}
+    desired_assignment = {}
+
+    # Correcciones en la tarea
+    if not teamwork_assignment.get("rubric_settings"):
+        plan["notes"].append(("warning", "Sin rúbrica asociada, la corrección debe ser realizada manualmente."))
+    else:
+        if teamwork_assignment["rubric_settings"].get("points_possible") != 100:
+            plan["notes"].append(("warning", f"Esta rúbrica tiene el puntaje máximo mal configurado ({teamwork_assignment['rubric_settings']['points_possible']})."))
+        desired_assignment["use_rubric_for_grading"] = True
+
+    desired_assignment.update({"grading_type": "points", "submission_types": ["online_upload"],
+                               "allowed_attempts": 2, "points_possible": 100})
+    for field, desired in writes.update("Tarea", assignment_step, teamwork_assignment, desired_assignment).items():
+        change("Tarea", field, teamwork_assignment.get(field), desired)
+
+    # Correcciones en el módulo (assignment group)
+    if correct_module:
+        current_module = {"name": correct_module.get("name"), "group_weight": correct_module.get("weight")}
+        desired_module = {"name": teamwork_assignment.get("name"), "group_weight": 30}
+        module_step = {"action": "update_group", "assignment_group_id": correct_module["id"]}
+        for field, desired in writes.update("Módulo", module_step, current_module, desired_module).items():
+            change("Módulo", field, current_module[field], desired)
+
+    # Correcciones en las categorías de grupo: eliminar 'Project Groups' si existe.
+    if correct_group_categories["Project Groups"]["exists"]:
+        plan["steps"].append({"action": "delete_group_category", "group_category_id": correct_group_categories["Project Groups"]["id"]})
+        change("Categorías de grupo", "Project Groups", "existe", "eliminada")
+
+    use_created_category = not correct_group_categories["Equipo de trabajo"]["exists"]
+    if use_created_category:
+        plan["steps"].append({"action": "create_group_category",
+                              "payload": {"name": "Equipo de trabajo", "self_signup": "disabled", "auto_leader": "random"}})
+        change("Categorías de grupo", "Equipo de trabajo", "no existe", "creada")
+        group_category_id = CREATED_CATEGORY
+    else:
+        group_category_id = correct_group_categories["Equipo de trabajo"]["id"]
+    if writes.update("Tarea", assignment_step, teamwork_assignment, {"group_category_id": group_category_id}):
+        change("Tarea", "group_category_id", teamwork_assignment.get("group_category_id"), group_category_id)
+
+    # Si no se han creado equipos, asignar estudiantes a equipos.
+    if correct_teams is None or not correct_teams.get("teams_created"):
+        plan["steps"].append({"action": "provision_teams", "min_size": TEAM_MIN_SIZE, "max_size": TEAM_MAX_SIZE,
+                              "group_category_id": None if use_created_category else correct_group_categories["Equipo de trabajo"]["id"]})
+        change("Equipos", "Equipo de trabajo", "sin equipos", f"equipos de {TEAM_MIN_SIZE} a {TEAM_MAX_SIZE} estudiantes")
+
+    # Configuración para Turnitin (revisión de similitud), salvo que ya se haya aplicado a esta versión de la tarea
+    applied = store.get_applied_settings(course_id, teamwork_assignment.get("id"),
+                                         teamwork_assignment.get("updated_at")) if store else {}
+    if writes.update("Tarea", assignment_step, applied, TURNITIN_SETTINGS):
+        change("Tarea", "Turnitin", "-", "activado")
+
+    # Las escrituras de la tarea y del módulo van al final: pueden depender de la categoría creada
+    plan["steps"].extend(writes.steps())
+    plan["coalesced"] = writes.log
+    return plan
+
+def apply_correction_plan(plan, store=None):
+    """
+    Ejecuta en orden las escrituras de un plan de corrección, informando al Reporter activo.
+    Los pasos que dependen de la categoría 'Equipo de trabajo' creada en el mismo plan se omiten
+    si su creación falla. Las actualizaciones de la tarea y del módulo se envían juntas al final
+    (ver flush_writes), y se informan las que se omitieron o combinaron al planificar.
+    Con un SnapshotStore, tras actualizar la tarea se registra que la configuración de Turnitin
+    quedó aplicada, junto al updated_at que retorna Canvas.
+    """
+    reporter = get_reporter()
+    course_id = plan["course_id"]
+    created_category_id = None
+    updates = []
+    for step in plan["steps"]:
+        action = step["action"]
+        if action == "delete_group_category":
+            response = canvas_request("delete", f"/group_categories/{step['group_category_id']}")
+            if response is not None:
+                reporter.info("Eliminado 'Project Groups'.")
+            else:
+                reporter.error("Error al eliminar 'Project Groups'.")
+        elif action == "create_group_category":
+            response = canvas_request("post", f"/courses/{course_id}/group_categories/", step["payload"])
+            if response:
+                created_category_id = response.get("id")
+            else:
+                reporter.warning("No se pudo crear la categoría 'Equipo de trabajo'.")
+        elif action == "provision_teams":
+            group_category_id = step["group_category_id"] or created_category_id
+            if group_category_id:
+                assign_students_to_teams(course_id, group_category_id, step["min_size"], step["max_size"])
+            else:
+                reporter.error("No se encontró o creó una categoría de grupo válida.")
+        elif action in ("update_assignment", "update_group"):
+            updates.append(step)
+    results = flush_writes(course_id, updates, created_category_id)
+    for step, result in zip(updates, results):
+        # La configuración de Turnitin quedó vigente: se envió en esta escritura o ya estaba aplicada
+        if store and result and step["action"] == "update_assignment" and result.get("updated_at"):
+            store.put_applied_settings(course_id, step["assignment_id"], result["updated_at"], TURNITIN_SETTINGS)
+    coalesced = plan.get("coalesced") or []
+    if coalesced:
+        merged = sum(entry["motivo"] == MERGED for entry in coalesced)
+        reporter.info(f"Tarea y módulo: {len(updates)} peticiones; {len(coalesced) - merged} escrituras omitidas "
+                      f"por no tener cambios y {merged} combinadas.")
+        reporter.details("Escritura", [f"{entry['recurso']} · {entry['campo']}: {entry['motivo']}" for entry in coalesced])
+
+def correct_teamwork_assignment(course_id):
+    """
+    Realiza las correcciones necesarias a la tarea 'Trabajo en equipo',
+    actualizando la tarea, el módulo y la categoría de grupo según corresponda.
+    """
+    plan = plan_teamwork_correction(course_id)
+    reporter = get_reporter()
+    for level, message in plan["notes"]:
+        getattr(reporter, level)(message)
+    apply_correction_plan(plan)
+
+def assignment_fingerprint(snapshot, assignment, kind):
+    """
+    Huella de las reglas (rules.RULES_VERSION) y de los datos de Canvas de los que depende el
+    análisis de una tarea: su updated_at, su rúbrica, el nombre y peso de su módulo y, si las
+    reglas de 'kind' usan equipos, las categorías de grupo, los equipos con sus miembros y los
+    estudiantes (crear equipos o matricular no cambia updated_at, y Canvas no informa otra fecha).
+    Retorna None si no se pudieron obtener los equipos: ese resultado no se reutiliza ni se guarda.
+    """
+    module_info = snapshot.module_info(assignment.get("assignment_group_id"))
+    data = [
+        RULES_VERSION, assignment.get("id"), assignment.get("updated_at"), assignment.get("rubric_settings"),
+        module_info and (module_info["name"], module_info["weight"]),
+    ]
+    if {"categories", "teams"} & required_sources([kind]):
+        team_data = snapshot.team_data()
+        if team_data is None:
+            return None
+        data.append(sorted((gc.get("id"), gc.get("name")) for gc in snapshot.group_categories))
+        data.append(team_data)
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+def review_course(course_id, store=None, cancel_event=None):
+    """
+    Revisa un curso completo sin escribir en la interfaz, para poder ejecutarse en un hilo de trabajo.
+    Retorna un diccionario con la información del curso, los resultados de cada sección y los errores.
+    Si se entrega un SnapshotStore, las tareas cuya huella no cambió desde la revisión anterior
+    reutilizan su resultado guardado ('reused' cuenta cuántas) y solo se descarga lo que piden
+    las huellas: los módulos con sus tareas y, si hay tareas de trabajo en equipo, las categorías,
+    los equipos y los estudiantes; la información del curso se lee de Canvas solo si algo cambió.
+    Si 'cancel_event' se activa mientras se descargan sus datos, se lanza CancelledError.
+    """
+    result = {"course_id": course_id, "course_info": None, "sections": [], "errors": [], "reused": 0, "analyzed": 0}
+    with use_reporter(CollectingReporter()) as collector, use_course(course_id):
+        try:
+            sources = required_sources(kind for _, _, kind in REVIEW_SECTIONS)
+            with get_metrics().phase(course_id, "fetch"):
+                if store:
+                    # Sin descarga adelantada, que traería todo: las categorías se piden solo si
+                    # alguna de las tareas encontradas las necesita
+                    snapshot = load_course_snapshot(course_id, {"assignment", "module"})
+                    if snapshot is not None:
+                        sources = required_sources(kind for kind, assignments in snapshot.assignments_by_kind.items()
+                                                   if assignments)
+                        if {"categories", "teams"} & sources:
+                            snapshot = load_course_snapshot(course_id, sources)
+                else:
+                    prefetch_course(course_id, sources, cancel_event)
+                    snapshot = load_course_snapshot(course_id, sources)
+            if snapshot is not None:
+                for _, label, kind in REVIEW_SECTIONS:
+                    matching = snapshot.assignments_by_kind[kind]
+                    reviews = {}
+                    pending = []
+                    for assignment in matching:
+                        fingerprint = assignment_fingerprint(snapshot, assignment, kind) if store else None
+                        stored = store.get_review(course_id, assignment["id"], label, fingerprint) if fingerprint else None
+                        if stored:
+                            reviews[assignment["id"]] = stored
+                            result["reused"] += 1
+                        else:
+                            pending.append((assignment, fingerprint))
+                    # Las tareas que cambiaron se evalúan juntas, en una sola pasada de las reglas
+                    # (incluye las descargas que solo pide el análisis, como los equipos)
+                    with get_metrics().phase(course_id, "analyze"):
+                        evaluated = analyze_assignments(snapshot, kind, [assignment for assignment, _ in pending])
+                    for (assignment, fingerprint), (details, third_column) in zip(pending, evaluated):
+                        reviews[assignment["id"]] = (details, third_column)
+                        result["analyzed"] += 1
+                        if fingerprint:
+                            store.put_review(course_id, assignment["id"], label, fingerprint, details, third_column)
+                    result["sections"].append((label, [(a["name"], *reviews[a["id"]]) for a in matching]))
+            if store and not result["analyzed"] and snapshot is not None:
+                result["course_info"] = store.get_course_info(course_id)
+            if result["course_info"] is None:
+                with get_metrics().phase(course_id, "fetch"):
+                    result["course_info"] = canvas_request("get", f"/courses/{course_id}")
+                if store and result["course_info"]:
+                    store.put_course_info(course_id, result["course_info"])
+        except CancelledError:
+            raise
+        except Exception as e:
+            logging.exception(f"Error revisando el curso {course_id}")
+            collector.error(f"Error inesperado revisando el curso {course_id}: {e}")
+    result["errors"] = collector.errors
+    return result
+
+def _review_unless_cancelled(course_id, store, cancel_event):
+    if cancel_event.is_set():
+        raise CancelledError()
+    return review_course(course_id, store, cancel_event)
+
+def review_courses(course_ids, max_workers=MAX_WORKERS, store=None, cancel_event=None):
+    """
+    Revisa los cursos en paralelo y entrega cada resultado apenas su curso termina.
+    'course_ids' puede ser cualquier iterable, incluso uno que se va descargando (ver
+    discover_courses): se consume a medida que se liberan hilos, con a lo más 2 * max_workers
+    cursos enviados al pool (uno en revisión y uno en espera por hilo), de modo que la revisión
+    empieza con la primera página.
+    Si se activa 'cancel_event' o se cierra el generador antes de terminar (por ejemplo, porque
+    la interfaz se interrumpió), no se inician más cursos, se cancelan las descargas asíncronas
+    en curso y se retorna sin esperar a los cursos que quedaban.
+    """
+    cancel_event = cancel_event or threading.Event()
+    executor = ContextThreadPoolExecutor(max_workers=max_workers)
+    pending_ids = iter(course_ids)
+    running = set()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(running) < 2 * max_workers and not cancel_event.is_set():
+                course_id = next(pending_ids, None)
+                if course_id is None:
+                    exhausted = True
+                else:
+                    running.add(executor.submit(_review_unless_cancelled, course_id, store, cancel_event))
+            if not running:
+                return
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                if cancel_event.is_set():
+                    return
+                yield future.result()
+    finally:
+        if running or not exhausted:
+            cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def open_snapshot_store(path=SNAPSHOT_DB, max_age_hours=SNAPSHOT_MAX_AGE_HOURS, read_only=False):
+    """Abre el almacén de resultados para revisiones incrementales."""
+    return SnapshotStore(path, max_age=max_age_hours * 3600, read_only=read_only)
+
+def _plan_course(course_id, store):
+    with use_reporter(CollectingReporter()) as collector, use_course(course_id):
+        try:
+            with get_metrics().phase(course_id, "plan"):
+                # El plan se compara siempre con los datos actuales de Canvas, no con los de la revisión
+                request_cache.invalidate(course_id)
+                prefetch_course(course_id)
+                plan = plan_teamwork_correction(course_id, store)
+        except Exception as e:
+            logging.exception(f"Error planificando el curso {course_id}")
+            plan = {"course_id": course_id, "course_info": None, "assignment_id": None, "assignment_name": None,
+                    "notes": [("error", f"Error inesperado planificando el curso {course_id}: {e}")],
+                    "changes": [], "steps": [], "coalesced": []}
+    plan["notes"] = [("error", error) for error in collector.errors] + plan["notes"]
+    return plan
+
+def plan_corrections(course_ids, max_workers=MAX_WORKERS, snapshot_db=SNAPSHOT_DB):
+    """
+    Calcula en paralelo los planes de corrección (solo lecturas) y los entrega a medida que terminan.
+    'snapshot_db' es donde apply_corrections registra la configuración aplicada (None para no usarlo);
+    se abre en modo solo lectura y únicamente si ya existe, de modo que planificar no crea el archivo.
+    """
+    store = open_snapshot_store(snapshot_db, read_only=True) if snapshot_db and os.path.exists(snapshot_db) else None
+    try:
+        with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_plan_course, course_id, store) for course_id in course_ids]
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        if store:
+            store.close()
+
+def _apply_course(plan, store, collector):
+    with use_reporter(collector), use_course(plan["course_id"]):
+        try:
+            with get_metrics().phase(plan["course_id"], "correct"):
+                apply_correction_plan(plan, store)
+        except Exception as e:
+            logging.exception(f"Error corrigiendo el curso {plan['course_id']}")
+            collector.error(f"Error inesperado corrigiendo el curso {plan['course_id']}: {e}")
+    return {"course_id": plan["course_id"], "course_info": plan["course_info"], "messages": collector.messages}
+
+def apply_corrections(plans, max_workers=MAX_WORKERS, snapshot_db=SNAPSHOT_DB, on_progress=None):
+    """
+    Aplica los planes en paralelo, un curso por hilo: los pasos de cada curso se ejecutan en orden
+    y a lo más 'max_workers' cursos se escriben a la vez. Entrega los mensajes de cada curso al terminar.
+    'on_progress(hechos, total)' recibe, cada vez que cambia, el avance sumado de las operaciones
+    largas de los cursos en curso (la creación de equipos); se invoca en el hilo que consume los
+    resultados, por lo que puede actualizar la página.
+    En 'snapshot_db' se registra la configuración aplicada (ver apply_correction_plan) y se
+    descartan los resultados guardados de cada curso corregido, aunque la revisión incremental
+    no esté activa: crear equipos no cambia ninguna huella. El archivo se crea recién cuando hay
+    algún paso que aplicar.
+    """
+    store = None
+    try:
+        with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+            collectors = {}
+            for plan in plans:
+                if plan["steps"]:
+                    if store is None and snapshot_db:
+                        store = open_snapshot_store(snapshot_db)
+                    collector = CollectingReporter()
+                    collectors[executor.submit(_apply_course, plan, store, collector)] = collector
+            running = set(collectors)
+            last_progress = None
+            while running:
+                # Con 'on_progress' se despierta periódicamente para leer el avance de los cursos en curso
+                done, running = wait(running, timeout=0.25 if on_progress else None, return_when=FIRST_COMPLETED)
+                if on_progress:
+                    current = [collectors[future].last_progress for future in running]
+                    current = [progress for progress in current if progress]
+                    totals = (sum(progress[0] for progress in current), sum(progress[1] for progress in current))
+                    if totals != last_progress:
+                        on_progress(*totals)
+                        last_progress = totals
+                for future in done:
+                    result = future.result()
+                    if store:
+                        store.forget_course(result["course_id"])
+                    yield result
+    finally:
+        if store:
+            store.close()
@@ -0,0 +1,203 @@
+"""
+Reglas de revisión de tareas, definidas como datos.
+
+Cada conjunto de reglas (foro, trabajo en equipo, trabajo final) es una lista de diccionarios:
+
+    requirement  Texto de la columna "Requerimiento".
+    field        Campo del registro de la tarea que se evalúa (ver FIELD_SOURCES).
+    op           Comparación: "eq", "ne", "truthy", "falsy", "is_null" o "not_null".
+    expected     Valor esperado para "eq" y "ne".
+
+y, para la columna "Actual":
+
+    ok_text      Texto cuando la regla se cumple.
+    show         Campo cuyo valor se muestra (con 'format': "int" o "percent").
+    show_if      Campo que debe ser verdadero para mostrar 'show'.
+    fail_text    Texto cuando no se cumple (o cuando no se cumple 'show_if'); admite {campo}.
+
+Las reglas se compilan una sola vez (COMPILED_RULES) en listas de predicados y se evalúan sobre
+un lote de registros en una pasada con 'evaluate'. 'required_sources' indica qué datos de Canvas
+necesitan, para no descargar lo que ninguna regla usa.
+"""
+import hashlib
+import json
+import string
+
+OK = "✅"
+FAIL = "🟥"
+
+NO_RUBRIC = "NO TIENE (Requiere configuracion manual)"
+
+# Tamaño de los equipos de 'Equipo de trabajo' (lo usan la regla, la revisión y la creación de equipos)
+TEAM_MIN_SIZE = 3
+TEAM_MAX_SIZE = 4
+
+# Origen de cada campo del registro de una tarea:
+#   assignment  la propia tarea,
+#   module      su assignment group (nombre y ponderación),
+#   categories  las categorías de grupo del curso,
+#   teams       los equipos y sus miembros (estudiantes, grupos y membresías: lo más costoso).
+FIELD_SOURCES = {
+    "rubric_has": "assignment",
+    "rubric_name": "assignment",
+    "rubric_points": "assignment",
+    "rubric_used_for_grading": "assignment",
+    "submission_types": "assignment",
+    "allowed_attempts": "assignment",
+    "grading_type": "assignment",
+    "points_possible": "assignment",
+    "group_category_id": "assignment",
+    "discussion_type": "assignment",
+    "module_name": "module",
+    "module_weight": "module",
+    "module_name_matches": "module",
+    "equipo_de_trabajo_exists": "categories",
+    "project_groups_exists": "categories",
+    "teams_created": "teams",
+    "teams_all_assigned": "teams",
+    "teams_unassigned_text": "teams",
+    "teams_duplicated_count": "teams",
+    "teams_badly_sized_count": "teams",
+    "teams_badly_sized_text": "teams",
+}
+
+_COMMON_RULES = [
+    {"requirement": "Tiene rubrica", "field": "rubric_has", "op": "truthy",
+     "show": "rubric_name", "show_if": "rubric_has", "fail_text": NO_RUBRIC},
+    {"requirement": "Puntos rubrica", "field": "rubric_points", "op": "eq", "expected": 100,
+     "show": "rubric_points", "format": "int", "show_if": "rubric_has", "fail_text": NO_RUBRIC},
+    {"requirement": "Usa rubrica para calificar", "field": "rubric_used_for_grading", "op": "truthy",
+     "ok_text": "SI", "fail_text": "NO"},
+]
+
+def _submission_rule(submission_type):
+    return {"requirement": "Tipo de entrega", "field": "submission_types", "op": "eq", "expected": (submission_type,),
+            "ok_text": "En linea", "fail_text": "Otro"}
+
+def _module_rules(weight):
+    return [
+        {"requirement": "Tipo de calificacion", "field": "grading_type", "op": "eq", "expected": "points",
+         "ok_text": "Puntos", "fail_text": "Otro"},
+        {"requirement": "Puntos posibles", "field": "points_possible", "op": "eq", "expected": 100,
+         "show": "points_possible", "format": "int"},
+        {"requirement": "Ponderacion", "field": "module_weight", "op": "eq", "expected": weight,
+         "show": "module_weight", "format": "percent"},
+        {"requirement": "Modulo", "field": "module_name_matches", "op": "truthy", "show": "module_name"},
+    ]
+
+RULESETS = {
+    "forum": _COMMON_RULES + [
+        _submission_rule("discussion_topic"),
+        {"requirement": "Intentos permitidos", "field": "allowed_attempts", "op": "eq", "expected": -1,
+         "ok_text": "Ilimitado", "show": "allowed_attempts"},
+    ] + _module_rules(20) + [
+        {"requirement": "Desactivar respuestas hilvadanas", "field": "discussion_type", "op": "eq", "expected": "threaded",
+         "ok_text": "SI", "fail_text": "NO"},
+    ],
+    "teamwork": _COMMON_RULES + [
+        _submission_rule("online_upload"),
+        {"requirement": "Intentos permitidos", "field": "allowed_attempts", "op": "eq", "expected": 2,
+         "show": "allowed_attempts"},
+    ] + _module_rules(30) + [
+        {"requirement": "Es trabajo en grupo", "field": "group_category_id", "op": "not_null",
+         "ok_text": "SI", "fail_text": "NO"},
+        {"requirement": "Existe Equipo de trabajo", "field": "equipo_de_trabajo_exists", "op": "truthy",
+         "ok_text": "SI", "fail_text": "NO"},
+        {"requirement": "Existe Project Groups", "field": "project_groups_exists", "op": "falsy",
+         "ok_text": "NO", "fail_text": "SI"},
+        {"requirement": "Equipos creados", "field": "teams_created", "op": "truthy",
+         "ok_text": "SI", "fail_text": "NO"},
+        {"requirement": "Alumnos Asignados", "field": "teams_all_assigned", "op": "truthy",
+         "ok_text": "SI", "fail_text": "NO ({teams_unassigned_text})"},
+        {"requirement": "Alumnos en más de un equipo", "field": "teams_duplicated_count", "op": "eq", "expected": 0,
+         "show": "teams_duplicated_count", "format": "int"},
+        {"requirement": f"Equipos de {TEAM_MIN_SIZE} a {TEAM_MAX_SIZE} integrantes", "field": "teams_badly_sized_count", "op": "eq", "expected": 0,
+         "ok_text": "SI", "fail_text": "NO ({teams_badly_sized_text})"},
+    ],
+    "finalwork": _COMMON_RULES + [
+        _submission_rule("online_upload"),
+        {"requirement": "Intentos permitidos", "field": "allowed_attempts", "op": "eq", "expected": 2,
+         "show": "allowed_attempts"},
+    ] + _module_rules(50) + [
+        {"requirement": "Es trabajo en grupo", "field": "group_category_id", "op": "is_null",
+         "ok_text": "NO", "fail_text": "SI"},
+    ],
+}
+
+OPS = {
+    "eq": lambda value, expected: value == expected,
+    "ne": lambda value, expected: value != expected,
+    "truthy": lambda value, expected: bool(value),
+    "falsy": lambda value, expected: not value,
+    "is_null": lambda value, expected: value is None,
+    "not_null": lambda value, expected: value is not None,
+}
+
+def _format_value(value, fmt):
+    if value is None:
+        return "-"
+    try:
+        if fmt == "int":
+            return str(int(value))
+        if fmt == "percent":
+            return f"{int(value)}%"
+    except (TypeError, ValueError):
+        pass
+    return str(value)
+
+def _template_fields(text):
+    return {name for _, name, _, _ in string.Formatter().parse(text or "") if name}
+
+def rule_fields(rule):
+    """Campos del registro que una regla lee, incluidos los que solo se muestran."""
+    fields = {rule["field"]}
+    fields.update(rule[key] for key in ("show", "show_if") if rule.get(key))
+    fields.update(_template_fields(rule.get("fail_text")))
+    return fields
+
+def compile_rule(rule):
+    """Convierte una regla en (requerimiento, predicado, formateador), ambos sobre un registro."""
+    field, expected, op = rule["field"], rule.get("expected"), OPS[rule["op"]]
+    ok_text, fail_text = rule.get("ok_text"), rule.get("fail_text")
+    show, show_if, fmt = rule.get("show"), rule.get("show_if"), rule.get("format")
+    fail_is_template = bool(_template_fields(fail_text))
+
+    def predicate(record):
+        return op(record.get(field), expected)
+
+    def describe(record, ok):
+        if ok and ok_text is not None:
+            return ok_text
+        if show and (show_if is None or record.get(show_if)):
+            return _format_value(record.get(show), fmt)
+        if fail_text is not None:
+            return fail_text.format(**record) if fail_is_template else fail_text
+        return ok_text if ok else "-"
+
+    return rule["requirement"], predicate, describe
+
+COMPILED_RULES = {kind: [compile_rule(rule) for rule in rules] for kind, rules in RULESETS.items()}
+
+# Huella de las reglas: cambia si se modifica cualquier regla, para no reutilizar resultados evaluados con otras
+RULES_VERSION = hashlib.sha1(json.dumps(RULESETS, sort_keys=True, default=str).encode()).hexdigest()
+
+def required_sources(kinds):
+    """Orígenes de datos (ver FIELD_SOURCES) que necesitan los conjuntos de reglas indicados."""
+    return {FIELD_SOURCES[field] for kind in kinds for rule in RULESETS[kind] for field in rule_fields(rule)}
+
+def evaluate(kind, records):
+    """
+    Evalúa las reglas de 'kind' sobre un lote de registros.
+    Retorna, para cada registro, (detalles, columna de estado) como los muestra la interfaz.
+    """
+    compiled = COMPILED_RULES[kind]
+    results = []
+    for record in records:
+        details = {}
+        third_column = []
+        for requirement, predicate, describe in compiled:
+            ok = predicate(record)
+            details[requirement] = describe(record, ok)
+            third_column.append(OK if ok else FAIL)
+        results.append((details, third_column))
+    return results
@@ -0,0 +1,131 @@
+"""
+Almacén local (SQLite) de los resultados de revisión, para revisiones incrementales.
+
+Cada resultado se guarda junto a una huella de los datos de Canvas que lo produjeron
+(updated_at de la tarea, módulo y, en el trabajo en equipo, categorías, equipos y estudiantes).
+En la siguiente revisión, si la huella no cambió y el resultado no es más antiguo que 'max_age',
+se reutiliza sin volver a evaluar las reglas de la tarea.
+
+También guarda la configuración que el revisor aplicó a una tarea y que Canvas no informa al
+leerla (la de Turnitin), junto al updated_at que Canvas retornó tras escribirla: mientras la
+tarea no cambie, esa configuración se considera vigente y no se vuelve a enviar.
+"""
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assignment_reviews (
+    course_id TEXT NOT NULL,
+    assignment_id INTEGER NOT NULL,
+    section TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    details TEXT NOT NULL,
+    third_column TEXT NOT NULL,
+    reviewed_at REAL NOT NULL,
+    PRIMARY KEY (course_id, assignment_id, section)
+);
+CREATE TABLE IF NOT EXISTS applied_settings (
+    course_id TEXT NOT NULL,
+    assignment_id INTEGER NOT NULL,
+    updated_at TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    applied_at REAL NOT NULL,
+    PRIMARY KEY (course_id, assignment_id)
+);
+CREATE TABLE IF NOT EXISTS courses (
+    course_id TEXT PRIMARY KEY,
+    course_info TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+class SnapshotStore:
+    """Acceso seguro para hilos a la base de resultados. Cada proceso debe abrir su propia instancia."""
+
+    def __init__(self, path, max_age=7 * 24 * 3600, read_only=False):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        if read_only:
+            # Solo lectura: no crea el archivo ni el esquema; falla si la base no existe
+            uri = f"{pathlib.Path(path).absolute().as_uri()}?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=30)
+            return
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def _is_fresh(self, timestamp):
+        return time.time() - timestamp < self.max_age
+
+    def get_review(self, course_id, assignment_id, section, fingerprint):
+        """Retorna (details, third_column) si hay un resultado vigente con la misma huella, o None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, details, third_column, reviewed_at FROM assignment_reviews "
+                "WHERE course_id = ? AND assignment_id = ? AND section = ?",
+                (str(course_id), assignment_id, section),
+            ).fetchone()
+        if row is None or row[0] != fingerprint or not self._is_fresh(row[3]):
+            return None
+        return json.loads(row[1]), json.loads(row[2])
+
+    def put_review(self, course_id, assignment_id, section, fingerprint, details, third_column):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO assignment_reviews VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(course_id), assignment_id, section, fingerprint,
+                 json.dumps(details, ensure_ascii=False), json.dumps(third_column, ensure_ascii=False), time.time()),
+            )
+
+    def get_course_info(self, course_id):
+        """Retorna la información del curso guardada si está vigente, o None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT course_info, fetched_at FROM courses WHERE course_id = ?", (str(course_id),)
+            ).fetchone()
+        if row is None or not self._is_fresh(row[1]):
+            return None
+        return json.loads(row[0])
+
+    def put_course_info(self, course_id, course_info):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO courses VALUES (?, ?, ?)",
+                (str(course_id), json.dumps(course_info, ensure_ascii=False), time.time()),
+            )
+
+    def get_applied_settings(self, course_id, assignment_id, updated_at):
+        """Retorna la configuración aplicada a la tarea si esta no cambió desde entonces, o {}."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated_at, settings FROM applied_settings WHERE course_id = ? AND assignment_id = ?",
+                (str(course_id), assignment_id),
+            ).fetchone()
+        if row is None or row[0] != updated_at:
+            return {}
+        return json.loads(row[1])
+
+    def put_applied_settings(self, course_id, assignment_id, updated_at, settings):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO applied_settings VALUES (?, ?, ?, ?, ?)",
+                (str(course_id), assignment_id, updated_at, json.dumps(settings, ensure_ascii=False), time.time()),
+            )
+
+    def forget_course(self, course_id):
+        """
+        Descarta los resultados guardados de un curso (por ejemplo, después de corregirlo).
+        La configuración aplicada se conserva: depende del updated_at de cada tarea.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM assignment_reviews WHERE course_id = ?", (str(course_id),))
+            self._conn.execute("DELETE FROM courses WHERE course_id = ?", (str(course_id),))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
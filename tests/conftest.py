@@ -0,0 +1,6 @@
+import os
+import sys
+
+# revisor lee TOKEN al importarse; las pruebas no hacen peticiones a Canvas
+os.environ.setdefault("TOKEN", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,63 @@
+"""Propiedades de team_sizes y distribuir_estudiantes, con y sin clave de equilibrio."""
+from collections import Counter
+
+from hypothesis import given, strategies as st
+
+from revisor import distribuir_estudiantes, team_sizes
+
+students = st.lists(st.integers(min_value=1, max_value=10**9), unique=True, max_size=300)
+
+
+@st.composite
+def bounds(draw):
+    min_size = draw(st.integers(min_value=1, max_value=8))
+    max_size = draw(st.integers(min_value=min_size, max_value=10))
+    return min_size, max_size
+
+
+def feasible(n_students, min_size, max_size):
+    """Hay alguna cantidad de equipos con todos sus tamaños dentro de [min_size, max_size]."""
+    return any(k * min_size <= n_students <= k * max_size for k in range(1, n_students + 1))
+
+
+def check_teams(student_ids, teams, min_size, max_size):
+    placed = [student_id for team in teams for student_id in team]
+    assert sorted(placed) == sorted(student_ids)  # cada estudiante exactamente una vez
+    sizes = [len(team) for team in teams]
+    assert all(size <= max_size for size in sizes)
+    if feasible(len(student_ids), min_size, max_size):
+        assert all(size >= min_size for size in sizes)
+    if sizes:
+        assert max(sizes) - min(sizes) <= 1
+
+
+@given(st.integers(min_value=0, max_value=10_000), bounds())
+def test_team_sizes(n_students, size_bounds):
+    min_size, max_size = size_bounds
+    sizes = team_sizes(n_students, min_size, max_size)
+    assert sum(sizes) == n_students
+    assert all(0 < size <= max_size for size in sizes)
+    if feasible(n_students, min_size, max_size):
+        assert all(size >= min_size for size in sizes)
+    if sizes:
+        assert max(sizes) - min(sizes) <= 1
+
+
+@given(students, bounds())
+def test_distribuir_estudiantes(student_ids, size_bounds):
+    min_size, max_size = size_bounds
+    teams = distribuir_estudiantes(student_ids, min_size, max_size)
+    check_teams(student_ids, teams, min_size, max_size)
+
+
+@given(students, bounds(), st.integers(min_value=1, max_value=12))
+def test_distribuir_estudiantes_con_clave(student_ids, size_bounds, n_keys):
+    min_size, max_size = size_bounds
+    key = lambda student_id: student_id % n_keys
+    teams = distribuir_estudiantes(student_ids, min_size, max_size, key)
+    check_teams(student_ids, teams, min_size, max_size)
+    # Los estudiantes de una misma clave quedan repartidos: a lo más ceil(g / equipos) por equipo
+    per_key = Counter(key(student_id) for student_id in student_ids)
+    for team in teams:
+        for value, count in Counter(key(student_id) for student_id in team).items():
+            assert count <= -(-per_key[value] // len(teams))